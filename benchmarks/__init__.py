@@ -0,0 +1,23 @@
+# encoding: utf-8
+
+"""
+Benchmarks for ``django-revisions`` at realistic scale.
+
+The benchmark seeds a throwaway test database with a configurable number of
+bundles and revisions for the models in ``revisions.tests.models`` and times
+the operations that matter in practice: listing and counting the latest
+revisions, fetching a revision history, revising, reverting, deleting and
+the admin history and diff views. For each operation it reports latency
+percentiles and query counts as JSON, so results can be tracked over time.
+
+Run it from the repository root, against SQLite::
+
+    python -m benchmarks.run --bundles 2000 --revisions 10
+
+or against a local PostgreSQL database::
+
+    REVISIONS_BENCHMARK_DATABASE=postgresql python -m benchmarks.run --output results.json
+
+See ``benchmarks.settings`` for the environment variables that configure 
+the PostgreSQL connection.
+"""
@@ -0,0 +1,178 @@
+# encoding: utf-8
+
+"""
+Runs the benchmark suite and reports the results as JSON.
+See ``benchmarks/__init__.py`` for usage.
+"""
+
+import os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import sys
+import json
+import time
+import random
+from optparse import OptionParser
+
+import django
+from django.db import connections, reset_queries, DEFAULT_DB_ALIAS
+from django.test.utils import setup_test_environment, teardown_test_environment
+from benchmarks.seed import seed
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = int(round(fraction * (len(values) - 1)))
+    return values[index]
+
+class Benchmark(object):
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.connection = connections[using]
+        self.results = []
+
+    def measure(self, model, operation, func, args_list):
+        """ Calls ``func`` once for every item in ``args_list``, and records
+        how long each call took and how many queries it ran. """
+        latencies = []
+        queries = []
+        for args in args_list:
+            reset_queries()
+            start = time.time()
+            func(*args)
+            latencies.append((time.time() - start) * 1000)
+            queries.append(len(self.connection.queries))
+
+        self.results.append({
+            'model': model._meta.object_name,
+            'operation': operation,
+            'calls': len(latencies),
+            'latency_ms': {
+                'p50': percentile(latencies, 0.5),
+                'p90': percentile(latencies, 0.9),
+                'p99': percentile(latencies, 0.99),
+                'max': max(latencies),
+                'mean': sum(latencies) / len(latencies),
+                },
+            'queries': {
+                'mean': float(sum(queries)) / len(queries),
+                'max': max(queries),
+                },
+            })
+
+    def skip(self, model, operation, reason):
+        self.results.append({
+            'model': model._meta.object_name,
+            'operation': operation,
+            'skipped': reason,
+            })
+
+def get_admin_views():
+    """ The admin views need ``revisions.admin``, which in turn needs a few
+    optional dependencies. """
+    from django.contrib.admin.sites import AdminSite
+    from django.contrib.auth.models import User
+    from django.test.client import RequestFactory
+    from revisions.admin import RevisionsHistoryVersionedAdmin
+
+    user = User(username='benchmark', is_staff=True, is_superuser=True)
+    factory = RequestFactory()
+
+    def get_request(path):
+        request = factory.get(path)
+        request.user = user
+        return request
+
+    def history(model, obj):
+        admin = RevisionsHistoryVersionedAdmin(model, AdminSite())
+        admin.revisions_history_view(get_request('/'), str(obj.pk)).render()
+
+    def diff(model, obj):
+        admin = RevisionsHistoryVersionedAdmin(model, AdminSite())
+        admin.revisions_diff_view(get_request('/'), str(obj.pk), str(obj.pk)).render()
+
+    return history, diff
+
+def run_model(benchmark, model, options):
+    rng = random.Random(options.seed)
+    cids = seed(model, options.bundles, options.revisions)
+    sample = rng.sample(cids, min(options.sample, len(cids)))
+    latest = lambda cid: model.latest.get(cid=cid)
+    calls = [()] * options.sample
+
+    benchmark.measure(model, 'latest.current',
+        lambda: list(model.latest.current[:options.page]), calls)
+    benchmark.measure(model, 'latest.count',
+        lambda: model.latest.count(), calls)
+    benchmark.measure(model, 'get_revisions',
+        lambda obj: list(obj.get_revisions()), [(latest(cid), ) for cid in sample])
+
+    try:
+        history, diff = get_admin_views()
+    except ImportError, error:
+        benchmark.skip(model, 'admin.history', str(error))
+        benchmark.skip(model, 'admin.diff', str(error))
+    else:
+        benchmark.measure(model, 'admin.history', history, [(model, latest(cid)) for cid in sample])
+        benchmark.measure(model, 'admin.diff', diff, [(model, latest(cid)) for cid in sample])
+
+    def revise(obj):
+        obj.body = 'A brand new revision.'
+        obj.revise()
+    benchmark.measure(model, 'revise', revise, [(latest(cid), ) for cid in sample])
+
+    def revert_to(obj):
+        first = obj.get_revisions()[0]
+        obj.revert_to(first.pk)
+    benchmark.measure(model, 'revert_to', revert_to, [(latest(cid), ) for cid in sample])
+    benchmark.measure(model, 'delete', lambda obj: obj.delete(), [(latest(cid), ) for cid in sample])
+
+def main(argv=None):
+    parser = OptionParser(usage="python -m benchmarks.run [options]")
+    parser.add_option('--bundles', type='int', default=2000,
+        help="How many bundles to create for each model [default: %default]")
+    parser.add_option('--revisions', type='int', default=10,
+        help="How many revisions to create for each bundle [default: %default]")
+    parser.add_option('--sample', type='int', default=50,
+        help="How many bundles or calls to time each operation on [default: %default]")
+    parser.add_option('--page', type='int', default=100,
+        help="Page size for listings of the latest revisions [default: %default]")
+    parser.add_option('--seed', type='int', default=0,
+        help="Random seed, for reproducible runs [default: %default]")
+    parser.add_option('--models', default='Story,UUIDStory,FancyStory,TrashableStory',
+        help="Comma-separated list of models from revisions.tests.models [default: %default]")
+    parser.add_option('--output', default=None,
+        help="Write results to this file instead of to stdout")
+    options, args = parser.parse_args(argv)
+
+    from revisions.tests import models
+    connection = connections[DEFAULT_DB_ALIAS]
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    connection.use_debug_cursor = True
+    benchmark = Benchmark()
+
+    try:
+        started = time.time()
+        for name in options.models.split(','):
+            run_model(benchmark, getattr(models, name.strip()), options)
+        report = {
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'bundles': options.bundles,
+            'revisions': options.revisions,
+            'sample': options.sample,
+            'seed': options.seed,
+            'duration_s': time.time() - started,
+            'results': benchmark.results,
+            }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if options.output:
+        open(options.output, 'w').write(output)
+    else:
+        sys.stdout.write(output + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# encoding: utf-8
+
+"""
+Fills the database with bundles of revisions, quickly.
+
+Saving hundreds of thousands of revisions one by one would take ages, so
+we insert them in bulk, revision round by revision round: first the first
+revision of every bundle, then the second and so on, so that, just like in
+real life, the revisions of a bundle end up spread out over the table.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+from django.db import connections, transaction
+from revisions.tests import models
+
+BATCH_SIZE = 250
+EPOCH = datetime(2010, 1, 1)
+
+def bulk_create(model, objs, using):
+    # Django 1.4 can't split up bulk inserts by itself
+    for i in range(0, len(objs), BATCH_SIZE):
+        model.objects.using(using).bulk_create(objs[i:i + BATCH_SIZE])
+
+def make_revision(model, bundle, revision):
+    return model(
+        cid=bundle,
+        title='Story %s' % bundle[:8],
+        slug='story-%s' % bundle[:8],
+        body=(u'Revision %i of a story. ' % revision) * 50,
+        )
+
+def seed_flat(model, bundles, revisions, using):
+    for revision in range(revisions):
+        objs = [make_revision(model, bundle, revision) for bundle in bundles]
+        bulk_create(model, objs, using)
+
+def seed_uuid(model, bundles, revisions, using):
+    # ``changed`` is the comparator here, but as an ``auto_now`` field it gets
+    # overwritten upon insert, so we set it afterwards, one round at a time
+    for revision in range(revisions):
+        objs = [make_revision(model, bundle, revision) for bundle in bundles]
+        for obj in objs:
+            obj.alt_id = uuid.uuid4().hex
+        bulk_create(model, objs, using)
+        model.objects.using(using).filter(pk__in=[obj.pk for obj in objs]) \
+            .update(changed=EPOCH + timedelta(hours=revision))
+
+def seed_inherited(model, bundles, revisions, using):
+    # Django can't bulk insert models with concrete inheritance, so we bulk
+    # insert into the parent table and add the child rows ourselves
+    parent = model._meta.pk.rel.to
+    ptr = model._meta.pk.column
+    local_fields = [field for field in model._meta.local_fields if not field.primary_key]
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        qn(model._meta.db_table),
+        ', '.join([qn(ptr)] + [qn(field.column) for field in local_fields]),
+        ', '.join(['%s'] * (len(local_fields) + 1)),
+        )
+
+    for revision in range(revisions):
+        marker = 'revision-%i-%s' % (revision, uuid.uuid4().hex[:8])
+        objs = [make_revision(parent, bundle, revision) for bundle in bundles]
+        for obj in objs:
+            obj.slug = marker
+        bulk_create(parent, objs, using)
+        pks = parent.objects.using(using).filter(slug=marker).values_list('pk', flat=True)
+        rows = [[pk] + [field.get_default() for field in local_fields] for pk in pks]
+        connection.cursor().executemany(sql, rows)
+        parent.objects.using(using).filter(slug=marker).update(slug='story')
+
+SEEDERS = {
+    models.Story: seed_flat,
+    models.TrashableStory: seed_flat,
+    models.UUIDStory: seed_uuid,
+    models.FancyStory: seed_inherited,
+    }
+
+def seed(model, bundles, revisions, using='default'):
+    """ Creates ``bundles`` new bundles of ``revisions`` revisions each, and
+    returns their bundle ids. """
+    cids = [uuid.uuid4().hex for i in range(bundles)]
+    with transaction.commit_on_success(using=using):
+        SEEDERS[model](model, cids, revisions, using)
+    return cids
@@ -0,0 +1,46 @@
+# encoding: utf-8
+
+"""
+Settings for the benchmark suite. The database is picked using the
+``REVISIONS_BENCHMARK_DATABASE`` environment variable, either ``sqlite``
+(the default) or ``postgresql``, in which case ``REVISIONS_BENCHMARK_NAME``, 
+``_USER``, ``_PASSWORD``, ``_HOST`` and ``_PORT`` tell us how to connect.
+"""
+
+import os
+
+def env(name, default=''):
+    return os.environ.get('REVISIONS_BENCHMARK_' + name, default)
+
+if env('DATABASE', 'sqlite') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql_psycopg2',
+            'NAME': env('NAME', 'revisions_benchmark'),
+            'USER': env('USER'),
+            'PASSWORD': env('PASSWORD'),
+            'HOST': env('HOST'),
+            'PORT': env('PORT'),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': env('NAME', 'revisions_benchmark.db'),
+        }
+    }
+
+DEBUG = False
+SECRET_KEY = 'revisions-benchmark'
+SITE_ID = 1
+ROOT_URLCONF = 'revisions.tests.urls'
+
+INSTALLED_APPS = (
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.admin',
+    'revisions',
+    'revisions.tests',
+)
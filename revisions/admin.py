@@ -25,24 +25,33 @@ Specify fields that need to be cleared as a list of attribute names like so::
 When in doubt, don't specify your own form and stick to the default: the AutoRevisionForm.
 """
 
+import time
+import calendar
+import hashlib
 from django.contrib import admin
 from revisions.managers import LatestManager
 from django import forms
-from django.shortcuts import get_object_or_404
 from django.utils.encoding import force_unicode, smart_unicode
+from django.utils import timezone
 from django.utils.text import capfirst
 from django.template.response import TemplateResponse
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.admin.util import unquote
-from django.http import Http404
-from django.core.exceptions import ObjectDoesNotExist
+from django.http import Http404, HttpResponseNotModified
+from django.db.models import Count, Max, Q
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag, urlencode
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.forms.models import BaseModelFormSet
+from revisions.instrumentation import instrumented
+from revisions.routers import db_for_history
+from revisions.diffs import diff_revisions, smart_localized_unicode
+from revisions.views import get_revision
 
 class AutoRevisionForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super(AutoRevisionForm, self).__init__(*args, **kwargs)
         
-        for field in self.instance.Versioning.clear_each_revision:
+        for field in self.instance._versioning.clear_each_revision:
             self.initial[field] = ''
 
 class RevisionForm(AutoRevisionForm):
@@ -61,81 +70,175 @@ class VersionedAdminMixin(object):
     
     def save_model(self, request, obj, form, change):
         """
-        Given a model instance save it to the database.
+        Given a model instance save it to the database: small changes 
+        (see ``RevisionForm``) in place, anything else as a new revision.
         """
-        obj.revise()
+        if getattr(obj, 'is_small_change', False):
+            obj.save_in_place()
+        else:
+            obj.revise()
         
-def smart_localized_unicode(val):
-    if val == None:
-        return ''
-    if isinstance(val, bool):
-        if val: return _('Yes')
-        return _('No')
-    
-    return smart_unicode(val)
+def is_not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if if_none_match:
+        return etag in parse_etags(if_none_match) or '*' in parse_etags(if_none_match)
+    elif if_modified_since and last_modified:
+        if_modified_since = parse_http_date_safe(if_modified_since)
+        return if_modified_since is not None and int(last_modified) <= if_modified_since
+    return False
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = quote_etag(etag)
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
 
 class RevisionsHistoryVersionedAdminMixin(VersionedAdminMixin):       
     change_form_template = 'admin/revisions_change_form.html'
     diff_ignored_fields = ['vid', 'vuser', 'vdatetime','cid']
+    history_per_page = 50
+
+    def get_history_aggregates(self, obj):
+        """ The latest comparator and the number of revisions in the bundle 
+        ``obj`` belongs to and, if there is one, the last time any of them
+        was changed, all from a single aggregate query. 
+        
+        Revisions can be changed in place, which doesn't add a revision, so 
+        on top of that we need something that changes along with them: the 
+        latest value of each ``auto_now`` field or, for hashed models that 
+        don't have one, the content hashes of the bundle. """
+        model = self.model
+        revisions = model.objects.using(db_for_history(model)).filter(cid=obj.cid)
+        aggregates = {'latest': Max(model._versioning.comparator_name), 'count': Count('pk')}
+        modified = [field.attname for field in model._meta.fields if getattr(field, 'auto_now', False)]
+        for name in modified:
+            if name == 'vdatetime':
+                aggregates['modified'] = Max(name)
+            else:
+                aggregates['modified_' + name] = Max(name)
+        aggregates = revisions.aggregate(**aggregates)
+        if model._versioning.hashed and not modified:
+            aggregates['hashes'] = list(revisions.order_by('pk').values_list('vhash', flat=True))
+        return aggregates
+
+    def get_history_validators(self, request, object_id, aggregates, *extra):
+        """ An ETag and a Last-Modified timestamp for the history of a bundle,
+        based on ``get_history_aggregates``. Returns ``(None, None)`` if there's 
+        no such bundle, or if there's no telling whether any of its revisions
+        were changed in place. """
+        if not aggregates['count']:
+            return None, None
+        markers = sorted([(name, value) for name, value in aggregates.items() 
+            if name not in ('latest', 'count')])
+        if not markers:
+            return None, None
+        
+        key = [self.model._meta.db_table, object_id, request.user.pk, aggregates['latest'], aggregates['count']]
+        key += list(extra) + markers
+        last_modified = None
+        modified = aggregates.get('modified')
+        if modified and timezone.is_naive(modified):
+            last_modified = int(time.mktime(modified.timetuple()))
+        elif modified:
+            last_modified = calendar.timegm(modified.utctimetuple())
+        return hashlib.sha1(repr(key)).hexdigest(), last_modified
+
+    def get_history_page(self, request, obj):
+        """ A page worth of revisions, newest first, starting from the 
+        revision (``?before=<comparator>&before_pk=<pk>``) the previous page 
+        left off at. Returns the revisions and the query string for the 
+        next page, if there is one. """
+        model = self.model
+        comparator_name = model._versioning.comparator_name
+        comparator = model._meta.get_field_by_name(comparator_name)[0]
+        revisions = model.objects.using(db_for_history(model)).filter(cid=obj.cid)
+        if 'vuser' in [field.name for field in model._meta.fields]:
+            revisions = revisions.select_related('vuser')
+        # the history only shows who changed what when, so we leave out 
+        # anything that's potentially large
+        if model._versioning.history_defer:
+            revisions = revisions.defer(*model._versioning.history_defer)
+
+        before = request.GET.get('before')
+        if before:
+            try:
+                before = comparator.to_python(before)
+                before_pk = model._meta.pk.to_python(request.GET.get('before_pk', before))
+            except ValidationError:
+                raise Http404('Invalid page.')
+            if comparator_name == model._versioning.pk_name:
+                revisions = revisions.filter(pk__lt=before)
+            else:
+                revisions = revisions.filter(
+                    Q(**{comparator_name + '__lt': before}) | 
+                    Q(**{comparator_name: before, 'pk__lt': before_pk}))
+
+        page = list(revisions.order_by('-' + comparator_name, '-pk')[:self.history_per_page + 1])
+        if len(page) > self.history_per_page:
+            page = page[:self.history_per_page]
+            last = page[-1]
+            next_page = urlencode({
+                'before': comparator.value_to_string(last),
+                'before_pk': last.pk,
+                })
+        else:
+            next_page = None
+        return page, next_page
     
+    @instrumented('revisions_history_view')
     def revisions_history_view(self, request, object_id, extra_context=None):
         "The 'revisions history' admin view for this model."
         model = self.model
         opts = model._meta
         app_label = opts.app_label
 
-        obj = get_object_or_404(model, pk=unquote(object_id))
+        obj = get_revision(model, unquote(object_id))
+
+        # no need to render the history again if nothing changed since last time
+        aggregates = self.get_history_aggregates(obj)
+        etag, last_modified = self.get_history_validators(request, object_id, aggregates, 
+            request.GET.get('before'), request.GET.get('before_pk'))
+        if etag and is_not_modified(request, etag, last_modified):
+            return set_validators(HttpResponseNotModified(), etag, last_modified)
+        revision_list, next_page = self.get_history_page(request, obj)
         context = {
             'title': '%s: %s' %(_('Change history'), force_unicode(obj)),
-            'revision_list': obj.get_revisions(),
+            'revision_list': revision_list,
+            'revision_count': aggregates['count'],
+            'next_page': next_page,
             'module_name': capfirst(force_unicode(opts.verbose_name_plural)),
             'object': obj,
             'app_label': app_label,
             'opts': opts,
         }
         context.update(extra_context or {})
-        return TemplateResponse(request, self.object_history_template or [
+        response = TemplateResponse(request, self.object_history_template or [
             "admin/%s/%s/object_revisions_history.html" % (app_label, opts.object_name.lower()),
             "admin/%s/object_revisions_history.html" % app_label,
             "admin/object_revisions_history.html"
         ], context, current_app=self.admin_site.name)
+        if etag:
+            set_validators(response, etag, last_modified)
+        return response
         
         
+    @instrumented('revisions_diff_view')
     def revisions_diff_view(self, request, object_id, diff_object_id, extra_context=None):
         "The 'revisions history' admin view for this model."
         model = self.model
         opts = model._meta
         app_label = opts.app_label
 
+        etag, last_modified = self.get_history_validators(request, object_id, 
+            self.get_history_aggregates(get_revision(model, unquote(object_id))), diff_object_id)
+        if etag and is_not_modified(request, etag, last_modified):
+            return set_validators(HttpResponseNotModified(), etag, last_modified)
         
-        try:
-            obj = model.objects.get(pk=unquote(diff_object_id))
-        except ObjectDoesNotExist:
-            raise Http404('No %s matches the given query.' % model._meta.object_name)
+        obj = get_revision(model, unquote(diff_object_id))
                 
-        diff_list = []
-        for field in model._meta.fields:
-            if field.name in self.diff_ignored_fields:
-                continue
-            
-            
-            toText = smart_localized_unicode(getattr(obj, field.name))
-            if obj.get_revisions().prev:
-                fromText = smart_localized_unicode(getattr(obj.get_revisions().prev, field.name))
-                diff_list.append({
-                                  'name': field.verbose_name,                       
-                                  'diff': obj.get_revisions().prev.show_diff_to(obj, field.name),
-                                  'from': fromText,
-                                  'to': toText
-                                  })
-            else:
-                diff_list.append({
-                                  'name': field.verbose_name,                       
-                                  'from': '',
-                                  'to': toText,
-                                  'diff': '<ins style="background:#e6ffe6;">%s</ins>' % fromText
-                                  }) 
-        
+        prev = obj.get_revisions().prev
+        diff_list = diff_revisions(prev, obj, exclude=self.diff_ignored_fields)
         
         context = {
             'title': '%s: %s' %(_('Change history'), force_unicode(obj)),
@@ -146,11 +249,14 @@ class RevisionsHistoryVersionedAdminMixin(VersionedAdminMixin):
             'opts': opts,
         }
         context.update(extra_context or {})
-        return TemplateResponse(request, self.object_history_template or [
+        response = TemplateResponse(request, self.object_history_template or [
             "admin/%s/%s/object_diff.html" % (app_label, opts.object_name.lower()),
             "admin/%s/object_diff.html" % app_label,
             "admin/object_diff.html"
         ], context, current_app=self.admin_site.name)
+        if etag:
+            set_validators(response, etag, last_modified)
+        return response
         
     def get_urls(self):
         urls = super(RevisionsHistoryVersionedAdminMixin, self).get_urls()
@@ -209,4 +315,7 @@ class RevisionsReverseInlineModelAdmin(ReverseInlineModelAdmin):
         return super(RevisionsReverseInlineModelAdmin, self).get_formset(request, obj, **kwargs)
 
     def save_model(self, request, obj, form, change):
-        obj.revise()
+        if getattr(obj, 'is_small_change', False):
+            obj.save_in_place()
+        else:
+            obj.revise()
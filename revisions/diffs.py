@@ -0,0 +1,75 @@
+# encoding: utf-8
+
+"""
+Per-field differences between two revisions, as shown by the admin diff 
+view (``revisions.admin.RevisionsHistoryVersionedAdminMixin``) and served
+by ``revisions.views.differ``.
+"""
+
+from django.utils.encoding import force_unicode, smart_unicode
+from django.utils.html import escape
+from django.utils.translation import ugettext as _
+from revisions.routers import db_for_history
+
+def smart_localized_unicode(val):
+    if val == None:
+        return ''
+    if isinstance(val, bool):
+        if val: return _('Yes')
+        return _('No')
+    
+    return smart_unicode(val)
+
+def is_previous_revision(prev, obj):
+    """ Whether ``prev`` is the revision that comes right before ``obj``. """
+    if prev.cid != obj.cid or not prev.comparator < obj.comparator:
+        return False
+    comparator_name = obj._versioning.comparator_name
+    return not obj._versioning.model.objects.using(db_for_history(obj._versioning.model)) \
+        .filter(cid=obj.cid, **{
+            comparator_name + '__gt': prev.comparator, 
+            comparator_name + '__lt': obj.comparator,
+            }).exists()
+
+def get_unchanged_fields(prev, obj):
+    # When the content hashes match, there's no need to diff the content fields, 
+    # and tracked models tell us which fields didn't change to begin with, 
+    # though only compared to the revision right before.
+    unchanged = []
+    if prev and obj.has_same_content(prev):
+        unchanged = [field.name for field in obj._versioning.content_fields]
+    if prev and obj._versioning.tracked and is_previous_revision(prev, obj):
+        changed = obj.get_changed_fields()
+        unchanged += [field.name for field in obj._versioning.tracked_fields if field.name not in changed]
+    return unchanged
+
+def diff_revisions(prev, obj, exclude=()):
+    """ The differences between ``prev`` and ``obj``, field by field. For the
+    first revision in a bundle, pass ``None`` as ``prev``. """
+    unchanged = get_unchanged_fields(prev, obj)
+    diff_list = []
+    for field in obj._meta.fields:
+        if field.name in exclude:
+            continue
+        
+        toText = smart_localized_unicode(getattr(obj, field.name))
+        if prev:
+            fromText = smart_localized_unicode(getattr(prev, field.name))
+            changed = field.name not in unchanged and fromText != toText
+            if changed:
+                diff = prev.show_diff_to(obj, field.name)
+            else:
+                diff = escape(toText)
+        else:
+            fromText = ''
+            changed = True
+            diff = '<ins style="background:#e6ffe6;">%s</ins>' % escape(toText)
+        diff_list.append({
+                          'field': field.name,
+                          'name': force_unicode(field.verbose_name),
+                          'diff': diff,
+                          'from': fromText,
+                          'to': toText,
+                          'changed': changed,
+                          })
+    return diff_list
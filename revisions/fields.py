@@ -1,7 +1,10 @@
 # encoding: utf-8
 
+import uuid
 from django.db import models
 from django import forms
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.utils.encoding import smart_str, smart_unicode
 from django.forms.util import flatatt
 from django.utils.safestring import mark_safe
 
@@ -53,4 +56,79 @@ class ReversionsManyToManyField(models.ManyToManyField):
             
         return getattr(obj, self.attname).model._default_manager.filter(pk__in=rev_obj_pks)
   
-    
\ No newline at end of file
+    
+
+BUNDLE_ID_TYPES = ('hex', 'uuid', 'integer')
+
+class BundleIdField(models.Field):
+    """ The content bundle id. How bundle ids get stored depends on 
+    ``Versioning.bundle_id`` or, failing that, the ``REVISIONS_BUNDLE_ID``
+    setting:
+
+    * ``'hex'`` (the default) stores a random UUID as a 32 character string
+    * ``'uuid'`` stores a random UUID in a native ``uuid`` column on PostgreSQL, 
+      and in a fixed-width ``char(32)`` column elsewhere
+    * ``'integer'`` stores the primary key of the first revision in a bundle 
+      in a ``bigint`` column, which makes for the smallest index and the 
+      fastest joins and groupings, but needs an extra query when creating
+      a bundle, and only works for models with integer primary keys
+
+    With concrete inheritance, bundle ids live on the base model, so it is
+    the base model that decides. To convert the bundle ids of existing 
+    revisions, see ``python manage.py convertbundleids``.
+    """
+
+    __metaclass__ = models.SubfieldBase
+
+    def __init__(self, *vargs, **kwargs):
+        self.explicit_id_type = kwargs.pop('id_type', None)
+        self.id_type = self.explicit_id_type
+        kwargs.setdefault('max_length', 36)
+        super(BundleIdField, self).__init__(*vargs, **kwargs)
+
+    def contribute_to_class(self, cls, name):
+        # abstract models pass on (deep copies of) their fields, so we 
+        # figure out the id type anew for every class we end up on
+        from django.conf import settings
+        versioning = getattr(cls, 'Versioning', None)
+        self.id_type = self.explicit_id_type or getattr(versioning, 'bundle_id', None) or \
+            getattr(settings, 'REVISIONS_BUNDLE_ID', 'hex')
+        if self.id_type not in BUNDLE_ID_TYPES:
+            raise ImproperlyConfigured("Unknown bundle id type %r for %s, choose from %s." % (
+                self.id_type, cls.__name__, ', '.join(BUNDLE_ID_TYPES)))
+        super(BundleIdField, self).contribute_to_class(cls, name)
+
+    def get_internal_type(self):
+        if self.id_type == 'integer':
+            return 'BigIntegerField'
+        else:
+            return 'CharField'
+
+    def db_type(self, connection):
+        data_types = connection.creation.data_types
+        if self.id_type == 'integer':
+            return data_types['BigIntegerField']
+        elif self.id_type == 'uuid' and connection.vendor == 'postgresql':
+            return 'uuid'
+        elif self.id_type == 'uuid':
+            return data_types['CharField'] % {'max_length': 32}
+        else:
+            return data_types['CharField'] % {'max_length': self.max_length}
+
+    def to_python(self, value):
+        if value is None or value == '':
+            return None
+        try:
+            if self.id_type == 'integer':
+                return int(value)
+            elif self.id_type == 'uuid':
+                if not isinstance(value, uuid.UUID):
+                    value = uuid.UUID(smart_str(value))
+                return value.hex
+            else:
+                return smart_unicode(value)
+        except (TypeError, ValueError):
+            raise ValidationError("%r is not a valid %s bundle id." % (value, self.id_type))
+
+    def get_prep_value(self, value):
+        return self.to_python(value)
@@ -0,0 +1,95 @@
+# encoding: utf-8
+
+"""
+Composite indexes for versioned models.
+
+Django (as of 1.4) can only index single columns, but the queries that
+``django-revisions`` runs all the time filter on several columns at once.
+Versioned models list the indexes they need in ``Model._versioning.indexes``
+and these get created right after ``syncdb`` creates the tables (see
+``revisions.management``.) For existing tables, run
+``python manage.py sqlrevisionindexes`` and apply its output.
+
+Every versioned model gets an index on ``(cid, comparator)``. With
+``REVISIONS_COVERING_INDEXES = True`` in your settings, models with a custom
+comparator get ``(cid, comparator, pk)`` instead, so that finding the latest
+revision of each bundle never has to touch the table itself. Custom
+comparators also get an index of their own, on ``(comparator, cid)``, for
+``Model.latest.changed_since``.
+"""
+
+from collections import namedtuple
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.backends.util import truncate_name
+
+# backends that can index a subset of the rows in a table
+PARTIAL_INDEX_VENDORS = ('postgresql', 'sqlite')
+
+class Index(namedtuple('Index', ['table', 'columns', 'unique', 'condition'])):
+    """ A composite index. Partial indexes come with a ``condition``, a tuple 
+    of ``(column, boolean)`` pairs, and only get created on backends that 
+    support them. """
+
+    def __new__(cls, table, columns, unique=False, condition=()):
+        return super(Index, cls).__new__(cls, table, columns, unique, condition)
+
+    def get_name(self, connection):
+        parts = self.columns + tuple(['%s_%s' % (column, value) for column, value in self.condition])
+        name = '%s_%s' % (self.table, connection.creation._digest(*parts))
+        return truncate_name(name, connection.ops.max_name_length())
+
+    def is_supported(self, connection):
+        return not self.condition or connection.vendor in PARTIAL_INDEX_VENDORS
+
+    def as_sql(self, connection):
+        qn = connection.ops.quote_name
+        sql = '%s %s ON %s (%s)' % (
+            self.unique and 'CREATE UNIQUE INDEX' or 'CREATE INDEX',
+            qn(self.get_name(connection)),
+            qn(self.table),
+            ', '.join([qn(column) for column in self.columns]),
+            )
+        if self.condition:
+            if connection.vendor == 'postgresql':
+                literals = {True: 'true', False: 'false'}
+            else:
+                literals = {True: '1', False: '0'}
+            sql += ' WHERE %s' % ' AND '.join(['%s = %s' % (qn(column), literals[bool(value)]) 
+                for column, value in self.condition])
+        return sql + ';'
+
+def sql_indexes(models, using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    output = []
+    for model in models:
+        for index in model._versioning.indexes:
+            if index.is_supported(connection):
+                output.append(index.as_sql(connection))
+    return output
+
+def get_index_names(cursor, connection, table):
+    """ The names of the indexes that already exist on a table. """
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s", [table])
+        return set([row[0] for row in cursor.fetchall()])
+    elif vendor == 'postgresql':
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [table])
+        return set([row[0] for row in cursor.fetchall()])
+    elif vendor == 'mysql':
+        cursor.execute("SHOW INDEX FROM %s" % connection.ops.quote_name(table))
+        return set([row[2] for row in cursor.fetchall()])
+    else:
+        return set()
+
+def create_indexes(models, using=DEFAULT_DB_ALIAS):
+    """ Creates the composite indexes for these models, 
+    skipping those that already exist. """
+    connection = connections[using]
+    cursor = connection.cursor()
+    for model in models:
+        existing = get_index_names(cursor, connection, model._meta.db_table)
+        for index in model._versioning.indexes:
+            if index.is_supported(connection) and index.get_name(connection) not in existing:
+                cursor.execute(index.as_sql(connection))
+    transaction.commit_unless_managed(using=using)
@@ -0,0 +1,131 @@
+# encoding: utf-8
+
+"""
+Instrumentation for the operations that make up revision handling.
+
+The operations that tend to eat up a database budget -- ``revise``,
+``clone``, ``get_revisions``, ``get_latest_revision``, fetching the latest
+revisions (``latest``), ``validate_bundle`` and the admin history views --
+send an ``operation_timed`` signal with how long they took and how many
+queries they ran. When nobody listens, they skip the bookkeeping entirely.
+
+You can listen to the signal yourself, or use a ``Collector`` to aggregate
+the numbers, e.g. per request with
+``revisions.middleware.RevisionsInstrumentationMiddleware``, or in tests
+with ``query_budget``::
+
+    with query_budget(self, 'revise', 4):
+        story.revise()
+"""
+
+import time
+import threading
+from functools import wraps
+from django.db import connections, models
+from django.dispatch import Signal
+from django.utils.datastructures import SortedDict
+
+operation_timed = Signal(providing_args=['operation', 'instance', 'duration', 'queries'])
+
+def get_model(obj):
+    # instances, classes (for classmethods), managers and model admins
+    if isinstance(obj, models.Model):
+        return obj.__class__
+    elif isinstance(obj, type):
+        return obj
+    else:
+        return getattr(obj, 'model', obj.__class__)
+
+def instrumented(operation):
+    """ Times a method (of a model, a manager or a model admin) and counts
+    the queries it runs, as ``operation``. """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *vargs, **kwargs):
+            if not operation_timed.receivers:
+                return method(self, *vargs, **kwargs)
+
+            # Django only logs queries in debug mode, unless we ask it to
+            debug_cursors = [(connection, connection.use_debug_cursor) for connection in connections.all()]
+            for connection, debug_cursor in debug_cursors:
+                connection.use_debug_cursor = True
+            before = sum([len(connection.queries) for connection, debug_cursor in debug_cursors])
+            start = time.time()
+            try:
+                return method(self, *vargs, **kwargs)
+            finally:
+                duration = time.time() - start
+                queries = sum([len(connection.queries) for connection, debug_cursor in debug_cursors]) - before
+                for connection, debug_cursor in debug_cursors:
+                    connection.use_debug_cursor = debug_cursor
+                operation_timed.send(sender=get_model(self), operation=operation,
+                    instance=self, duration=duration, queries=queries)
+        return wrapper
+    return decorator
+
+class Collector(object):
+    """ Aggregates ``operation_timed`` signals sent from the thread that
+    started the collector. Use it as a context manager, or call
+    ``start`` and ``stop`` yourself. """
+
+    def __init__(self):
+        self.operations = SortedDict()
+        self.calls = []
+        self.thread = None
+
+    def record(self, sender, operation, duration, queries, **kwargs):
+        if threading.current_thread() is not self.thread:
+            return
+
+        self.calls.append((operation, sender, duration, queries))
+        stats = self.operations.setdefault(operation, {'calls': 0, 'duration': 0.0, 'queries': 0, 'max_queries': 0})
+        stats['calls'] += 1
+        stats['duration'] += duration
+        stats['queries'] += queries
+        stats['max_queries'] = max(stats['max_queries'], queries)
+
+    def start(self):
+        self.thread = threading.current_thread()
+        operation_timed.connect(self.record, weak=False, dispatch_uid=id(self))
+        return self
+
+    def stop(self):
+        operation_timed.disconnect(dispatch_uid=id(self))
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def summary(self):
+        """ Totals per operation, ready to be serialized. Note that operations
+        can be nested (``revise`` calls ``clone``), so the totals of different
+        operations overlap. """
+        return dict([(operation, dict(stats)) for operation, stats in self.operations.items()])
+
+class query_budget(object):
+    """ A test helper that fails if any call to ``operation`` inside of the
+    block runs more than ``max_queries`` queries. """
+
+    def __init__(self, testcase, operation, max_queries):
+        self.testcase = testcase
+        self.operation = operation
+        self.max_queries = max_queries
+        self.collector = Collector()
+
+    def __enter__(self):
+        self.collector.start()
+        return self.collector
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.collector.stop()
+        if exc_type is not None:
+            return
+
+        calls = [queries for operation, sender, duration, queries in self.collector.calls
+            if operation == self.operation]
+        self.testcase.assertTrue(calls, "%s was never called." % self.operation)
+        self.testcase.assertTrue(max(calls) <= self.max_queries,
+            "%s ran %i queries, more than the budget of %i." % (self.operation, max(calls), self.max_queries))
@@ -0,0 +1,18 @@
+# encoding: utf-8
+
+from django.db.models import signals
+from revisions import indexes, models as revisions_app
+from revisions.registry import registry
+
+def create_composite_indexes(sender, created_models, verbosity=1, db=None, **kwargs):
+    """ Right after ``syncdb`` creates the tables for versioned models, we add
+    the composite indexes Django can't create by itself. """
+    models = [model for model in created_models if model in registry]
+    if models:
+        if verbosity >= 1:
+            print "Creating composite indexes for versioned models ..."
+        indexes.create_indexes(models, using=db)
+
+# post_syncdb gets sent once for every installed app, 
+# but ``created_models`` covers all of them
+signals.post_syncdb.connect(create_composite_indexes, sender=revisions_app)
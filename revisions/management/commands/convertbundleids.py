@@ -0,0 +1,107 @@
+# encoding: utf-8
+
+import uuid
+from optparse import make_option
+from django.core.management.base import LabelCommand, CommandError
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models import get_model
+from revisions.registry import registry
+
+class Command(LabelCommand):
+    help = ("Converts the bundle ids of existing revisions of the given model(s) "
+        "to the type of bundle id the model is now configured to use, chunk by chunk. "
+        "Safe to interrupt and run again.")
+    args = '<app_label.ModelName app_label.ModelName ...>'
+    label = 'app_label.ModelName'
+
+    option_list = LabelCommand.option_list + (
+        make_option('--database', action='store', dest='database',
+            default=DEFAULT_DB_ALIAS, help='Nominates a database to convert. '
+                'Defaults to the "default" database.'),
+        make_option('--chunk-size', action='store', dest='chunk_size', type='int',
+            default=1000, help='How many bundles to convert per transaction. '
+                'Defaults to 1000.'),
+    )
+
+    def handle_label(self, label, **options):
+        try:
+            app_label, model_name = label.split('.')
+        except ValueError:
+            raise CommandError("Expected app_label.ModelName, got %r." % label)
+        model = get_model(app_label, model_name)
+        if model is None or model not in registry:
+            raise CommandError("%s is not a versioned model." % label)
+
+        self.connection = connections[options.get('database')]
+        self.using = options.get('database')
+        self.verbosity = int(options.get('verbosity', 1))
+        versioning = model._versioning
+        field = versioning.base_model._meta.get_field('cid')
+        qn = self.connection.ops.quote_name
+        self.table = qn(versioning.base_table)
+        self.column = qn(field.column)
+        self.pk_column = qn(versioning.base_model._meta.pk.column)
+
+        # first make room for both old and new bundle ids, then convert them
+        # and finally switch over to the column type the model asks for
+        self.alter_column('varchar(36)')
+        if versioning.bundle_id == 'integer':
+            converted = self.convert_to_integers(options['chunk_size'])
+        else:
+            converted = self.convert_to_uuids(options['chunk_size'])
+        self.alter_column(field.db_type(self.connection))
+
+        if self.verbosity:
+            self.stdout.write("Converted %i bundles of %s to %s bundle ids.\n" % (
+                converted, label, versioning.bundle_id))
+
+    def alter_column(self, db_type):
+        # SQLite doesn't care about column types
+        vendor = self.connection.vendor
+        if vendor == 'postgresql':
+            if db_type.startswith('varchar'):
+                cast = "replace(%s::text, '-', '')" % self.column
+            else:
+                cast = '%s::%s' % (self.column, db_type)
+            sql = 'ALTER TABLE %s ALTER COLUMN %s TYPE %s USING %s' % (
+                self.table, self.column, db_type, cast)
+        elif vendor == 'mysql':
+            sql = 'ALTER TABLE %s MODIFY %s %s NULL' % (self.table, self.column, db_type)
+        else:
+            return
+
+        if self.verbosity > 1:
+            self.stdout.write(sql + '\n')
+        self.connection.cursor().execute(sql)
+        transaction.commit_unless_managed(using=self.using)
+
+    def convert(self, select, chunk_size, get_bundle_id):
+        converted = 0
+        while True:
+            with transaction.commit_on_success(using=self.using):
+                cursor = self.connection.cursor()
+                cursor.execute(select % {'table': self.table, 'cid': self.column, 
+                    'pk': self.pk_column, 'limit': chunk_size})
+                rows = cursor.fetchall()
+                cursor.executemany('UPDATE %s SET %s = %%s WHERE %s = %%s' % (
+                    self.table, self.column, self.column),
+                    [(get_bundle_id(row), row[0]) for row in rows])
+            converted += len(rows)
+            if self.verbosity > 1 and rows:
+                self.stdout.write("Converted %i bundles...\n" % converted)
+            if len(rows) < chunk_size:
+                return converted
+
+    def convert_to_integers(self, chunk_size):
+        # the bundle id becomes the primary key of the first revision in the
+        # bundle, which can never clash with the id of another bundle
+        return self.convert('SELECT %(cid)s, MIN(%(pk)s) FROM %(table)s '
+            'WHERE LENGTH(%(cid)s) = 32 GROUP BY %(cid)s LIMIT %(limit)i',
+            chunk_size, lambda row: str(row[1]))
+
+    def convert_to_uuids(self, chunk_size):
+        # hex strings and UUIDs only differ in how they're stored, 
+        # so it's just integer ids that need replacing
+        return self.convert('SELECT DISTINCT %(cid)s FROM %(table)s '
+            'WHERE LENGTH(%(cid)s) < 32 LIMIT %(limit)i',
+            chunk_size, lambda row: uuid.uuid4().hex)
@@ -0,0 +1,104 @@
+# encoding: utf-8
+
+import json
+from datetime import datetime, time
+from itertools import groupby
+from optparse import make_option
+from django.core.management.base import LabelCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.serializers.python import Serializer as PythonSerializer
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import get_model
+from revisions.registry import registry
+
+class JSONEncoder(DjangoJSONEncoder):
+    # Django rounds off to milliseconds, but comparators 
+    # are often datetimes, and these need to stay intact
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super(JSONEncoder, self).default(o)
+
+class Serializer(PythonSerializer):
+    # many-to-many relations get fetched for a whole chunk of revisions at once
+    def handle_m2m_field(self, obj, field):
+        pass
+
+def get_many_to_many(model, pks, using):
+    """ The ids of the objects each of these revisions relates to,
+    with a single query per many-to-many field. """
+    relations = dict([(pk, {}) for pk in pks])
+    for field in model._meta.many_to_many:
+        if not field.rel.through._meta.auto_created:
+            continue
+        source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+        for relation in relations.values():
+            relation[field.name] = []
+        rows = field.rel.through._default_manager.using(using) \
+            .filter(**{source + '__in': pks}).order_by(target).values_list(source, target)
+        for pk, related_pk in rows.iterator():
+            relations[pk][field.name].append(related_pk)
+    return relations
+
+class Command(LabelCommand):
+    help = ("Exports the full history of every bundle of the given model(s) as JSON Lines, "
+        "one bundle per line, chunk by chunk. Use importbundles to load the output.")
+    args = '<app_label.ModelName app_label.ModelName ...>'
+    label = 'app_label.ModelName'
+
+    option_list = LabelCommand.option_list + (
+        make_option('--database', action='store', dest='database',
+            default=DEFAULT_DB_ALIAS, help='Nominates a database to export from. '
+                'Defaults to the "default" database.'),
+        make_option('--chunk-size', action='store', dest='chunk_size', type='int',
+            default=500, help='How many bundles to fetch per query. '
+                'Defaults to 500.'),
+        make_option('--output', action='store', dest='output', default=None,
+            help='Write to this file instead of to stdout.'),
+    )
+
+    def handle(self, *labels, **options):
+        if options.get('output'):
+            self.stdout = open(options['output'], 'w')
+        try:
+            return super(Command, self).handle(*labels, **options)
+        finally:
+            if options.get('output'):
+                self.stdout.close()
+
+    def handle_label(self, label, **options):
+        try:
+            app_label, model_name = label.split('.')
+        except ValueError:
+            raise CommandError("Expected app_label.ModelName, got %r." % label)
+        model = get_model(app_label, model_name)
+        if model is None or model not in registry:
+            raise CommandError("%s is not a versioned model." % label)
+        if model._meta.parents:
+            raise CommandError("%s inherits from another model, so its revisions "
+                "can't be imported in bulk." % label)
+
+        using = options.get('database')
+        comparator_name = model._versioning.comparator_name
+        model_label = '%s.%s' % (model._meta.app_label, model._meta.object_name.lower())
+        exported = 0
+        for cids in model.latest.db_manager(using).bundle_id_chunks(options['chunk_size']):
+            revisions = list(model._base_manager.using(using).filter(cid__in=cids)
+                .order_by('cid', comparator_name, 'pk'))
+            relations = get_many_to_many(model, [revision.pk for revision in revisions], using)
+            for cid, bundle in groupby(revisions, lambda revision: revision.cid):
+                bundle = list(bundle)
+                serialized = Serializer().serialize(bundle)
+                for revision, data in zip(bundle, serialized):
+                    del data['model']
+                    data['fields'].update(relations[revision.pk])
+                self.stdout.write(json.dumps({
+                    'model': model_label,
+                    'cid': cid,
+                    'revisions': serialized,
+                    }, cls=JSONEncoder) + '\n')
+                exported += 1
+
+        # stdout may well be the export itself
+        if int(options.get('verbosity', 1)) > 1:
+            self.stderr.write("Exported %i bundles of %s.\n" % (exported, label))
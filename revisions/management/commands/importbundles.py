@@ -0,0 +1,113 @@
+# encoding: utf-8
+
+import json
+from optparse import make_option
+from django.core.management.base import LabelCommand, CommandError
+from django.core.management.color import no_style
+from django.core.serializers.python import Deserializer
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models import get_model
+from revisions.registry import registry
+
+# how many rows go into a single insert; Django 1.4 doesn't keep track of
+# this for us, and SQLite takes no more than 999 parameters per query
+BATCH_SIZE = 500
+
+def get_batch_size(connection, fields):
+    if connection.vendor == 'sqlite':
+        return max(min(999 // len(fields), BATCH_SIZE), 1)
+    return BATCH_SIZE
+
+def insert_in_batches(model, objs, fields, using, raw=False):
+    batch_size = get_batch_size(connections[using], fields)
+    for i in range(0, len(objs), batch_size):
+        model._base_manager._insert(objs[i:i + batch_size], fields=fields, using=using, raw=raw)
+
+class Command(LabelCommand):
+    help = ("Imports bundles (as exported by exportbundles) from the given JSON Lines file(s), "
+        "chunk by chunk, keeping their bundle ids, primary keys and comparators. "
+        "Bundles that already exist are skipped, so it's safe to interrupt and run again.")
+    args = '<filename filename ...>'
+    label = 'filename'
+
+    option_list = LabelCommand.option_list + (
+        make_option('--database', action='store', dest='database',
+            default=DEFAULT_DB_ALIAS, help='Nominates a database to import into. '
+                'Defaults to the "default" database.'),
+        make_option('--chunk-size', action='store', dest='chunk_size', type='int',
+            default=500, help='How many bundles to import per transaction. '
+                'Defaults to 500.'),
+    )
+
+    def handle_label(self, filename, **options):
+        self.using = options.get('database')
+        self.connection = connections[self.using]
+        self.verbosity = int(options.get('verbosity', 1))
+        self.imported = 0
+        self.models = set()
+
+        model, chunk = None, []
+        for line in open(filename):
+            if not line.strip():
+                continue
+            bundle = json.loads(line)
+            bundle_model = self.get_model(bundle['model'])
+            if chunk and (bundle_model is not model or len(chunk) == options['chunk_size']):
+                self.import_bundles(model, chunk)
+                chunk = []
+            model = bundle_model
+            chunk.append(bundle)
+        if chunk:
+            self.import_bundles(model, chunk)
+
+        # we've inserted primary keys ourselves, so sequences need catching up
+        cursor = self.connection.cursor()
+        for sql in self.connection.ops.sequence_reset_sql(no_style(), list(self.models)):
+            cursor.execute(sql)
+        transaction.commit_unless_managed(using=self.using)
+
+        if self.verbosity:
+            self.stdout.write("Imported %i bundles from %s.\n" % (self.imported, filename))
+
+    def get_model(self, label):
+        model = get_model(*label.split('.'))
+        if model is None or model not in registry:
+            raise CommandError("%s is not a versioned model." % label)
+        if model._meta.parents:
+            raise CommandError("%s inherits from another model, so its revisions "
+                "can't be imported in bulk." % label)
+        return model
+
+    def import_bundles(self, model, bundles):
+        field = model._meta.get_field('cid')
+        cids = [field.to_python(bundle['cid']) for bundle in bundles]
+        existing = set([field.to_python(cid) for cid in model._base_manager.using(self.using)
+            .filter(cid__in=cids).values_list('cid', flat=True).distinct()])
+
+        label = '%s.%s' % (model._meta.app_label, model._meta.object_name.lower())
+        objects = [dict(revision, model=label) for bundle in bundles
+            if field.to_python(bundle['cid']) not in existing for revision in bundle['revisions']]
+        deserialized = list(Deserializer(objects, using=self.using))
+        revisions = [obj.object for obj in deserialized]
+
+        with transaction.commit_on_success(using=self.using):
+            # A raw insert, just like ``loaddata`` does, because ``bulk_create``
+            # would overwrite ``auto_now`` fields, and these are often the comparator.
+            insert_in_batches(model, revisions, model._meta.local_fields, self.using, raw=True)
+
+            for m2m in model._meta.many_to_many:
+                through = m2m.rel.through
+                if not through._meta.auto_created:
+                    continue
+                source = through._meta.get_field(m2m.m2m_field_name()).attname
+                target = through._meta.get_field(m2m.m2m_reverse_field_name()).attname
+                relations = [through(**{source: obj.object.pk, target: related_pk})
+                    for obj in deserialized for related_pk in obj.m2m_data.get(m2m.name, [])]
+                batch_size = get_batch_size(self.connection, [source, target])
+                for i in range(0, len(relations), batch_size):
+                    through._default_manager.using(self.using).bulk_create(relations[i:i + batch_size])
+
+        self.models.add(model)
+        self.imported += len(bundles) - len(existing)
+        if self.verbosity > 1:
+            self.stdout.write("Imported %i bundles...\n" % self.imported)
@@ -0,0 +1,23 @@
+# encoding: utf-8
+
+from optparse import make_option
+from django.core.management.base import AppCommand
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import get_models
+from revisions import indexes
+from revisions.registry import registry
+
+class Command(AppCommand):
+    help = "Prints the CREATE INDEX SQL statements for the composite indexes of versioned models in the given app name(s)."
+
+    option_list = AppCommand.option_list + (
+        make_option('--database', action='store', dest='database',
+            default=DEFAULT_DB_ALIAS, help='Nominates a database to print the '
+                'SQL for.  Defaults to the "default" database.'),
+    )
+
+    output_transaction = True
+
+    def handle_app(self, app, **options):
+        models = [model for model in get_models(app, include_auto_created=True) if model in registry]
+        return u'\n'.join(indexes.sql_indexes(models, using=options.get('database'))).encode('utf-8')
@@ -1,49 +1,263 @@
 # encoding: utf-8
 
+from collections import namedtuple
 from datetime import datetime
 from django.utils.encoding import force_unicode
 
-from django.db import models
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models, connections
+from django.db.models import Q
 from django.db.models.aggregates import Max
 
 import inspect
+from revisions.instrumentation import instrumented
+from revisions.routers import db_for_latest, db_for_history
 
 
-def get_table_for_field(model, field_name):
-    for field in model._meta.fields:
-        if field_name == field.attname:
-            return field.model._meta.db_table
-    return None
+def latest_per_bundle(qs, candidates):
+    """
+    Limits ``qs`` to the newest revision of each bundle among ``candidates``, 
+    a queryset on the same model, using a single query.
+    
+    When the comparator is the primary key, the newest revision of each bundle
+    is simply the one with the highest primary key. Other comparators, like a
+    ``changed`` datetime, may well be shared between bundles, so in that case
+    we match (bundle, comparator) pairs instead.
+    """
+    opts = qs.model._versioning
+    latest = candidates.values('cid').annotate(max_comparator=Max(opts.comparator_name))
+    
+    if opts.comparator_name == opts.pk_name:
+        return qs.filter(pk__in=latest.values_list('max_comparator', flat=True))
+    else:
+        qn = connections[qs.db].ops.quote_name
+        column = opts.model._meta.get_field_by_name(opts.comparator_name)[0].column
+        sql, params = latest.values_list('cid', 'max_comparator').query.get_compiler(qs.db).as_sql()
+        where = '(%s.%s, %s.%s) IN (%s)' % (
+            qn(opts.base_table), qn('cid'), qn(opts.comparator_table), qn(column), sql)
+        return qs.extra(where=[where], params=params)
+
+
+# how far a consumer of ``LatestManager.changed_since`` got: the comparator 
+# and primary key of the newest revision, the time and bundle id of the latest
+# trashing and the latest tombstone it has seen
+Watermark = namedtuple('Watermark', ['comparator', 'pk', 'trashed_at', 'trashed_cid', 'tombstone'])
 
 
 class LatestQuerySet(models.query.QuerySet):
+    # querysets are lazy, so this is where the actual work happens
+    def iterator(self):
+        return iter(self._fetch())
+
+    @instrumented('latest')
+    def _fetch(self):
+        return list(super(LatestQuerySet, self).iterator())
+
     # not too nice performance-wise, but the easiest solution
     # to make counts play nice with revisions
     def count(self):
-        return len(list(self.iterator()))
+        return len(self._fetch())
         
 
 class LatestManager(models.Manager):
     """ A manager that returns the latest revision of each bundle of content. """
 
-    @property
-    def current(self):
-        qs = LatestQuerySet(self.model, using=self._db)
+    def _all_revisions(self, using):
+        return models.query.QuerySet(self.model, using=using)
+
+    def _get_latest(self, *args, **lookups):
+        using = self._db or db_for_latest(self.model)
+        qs = LatestQuerySet(self.model, using=using).filter(*args, **lookups)
     
-        # in case of concrete inheritance, we need the base table, not the leaf
-        base = qs.query.model.get_base_model()
-        base_table = base._meta.db_table
+        # the latest revision of a temporal model is the one that's still valid
+        if self.model._versioning.temporal:
+            return qs.filter(valid_to__isnull=True)
 
         # this may or may not be the fastest way to get the last revision of every
         # piece of content, depending on how your database query optimizer works, 
         # but it sure as hell is the easiest way to do it in Django without resorting
         # to multiple queries or working entirely with raw SQL.
-        comparator_name = base.get_comparator_name()  
-        comparator_table = get_table_for_field(qs.query.model, comparator_name)
- 
-        qs = qs.filter(pk__in = qs.values('cid').annotate(max_vid=Max(comparator_name)).values_list('max_vid', flat=True))
+        return latest_per_bundle(qs, self._all_revisions(using).filter(*args, **lookups))
+
+    @property
+    def current(self):
+        return self._get_latest()
+
+    def iter_chunks(self, size=500):
+        """ 
+        Iterates over the latest revision of every bundle, ``size`` bundles 
+        at a time, without ever loading more than a single chunk into memory.
+        
+        Chunks are found by walking the ``(cid, comparator)`` index, starting 
+        right after the last bundle id of the previous chunk rather than at an
+        offset, so each chunk costs just as much as the first, and bundles 
+        created or revised in the meantime don't make us skip or repeat any 
+        others. A bundle that gets revised while we're busy shows up with
+        whatever revision is the latest when we get to it.
+        """
+        for cids in self.bundle_id_chunks(size):
+            for obj in self._get_latest(cid__in=cids).order_by('cid').iterator():
+                yield obj
+
+    def bundle_id_chunks(self, size=500):
+        """ Every bundle id, in order, as lists of (at most) ``size`` ids. 
+        See ``iter_chunks``. """
+        using = self._db or db_for_latest(self.model)
+        bundles = self._all_revisions(using).order_by('cid').values_list('cid', flat=True).distinct()
+        last = None
+        while True:
+            if last is None:
+                cids = list(bundles[:size])
+            else:
+                cids = list(bundles.filter(cid__gt=last)[:size])
+            if not cids:
+                break
+
+            yield cids
+
+            if len(cids) < size:
+                break
+            last = cids[-1]
+
+    def changed_since(self, watermark=None, limit=None):
+        """
+        Every bundle that changed since ``watermark``, for consumers like 
+        search indexes and caches that want to keep up with changes without
+        rescanning all content.
+        
+        Returns the latest revision of each bundle that got a new revision 
+        since, in comparator order, followed by the latest revision of each 
+        bundle that got trashed since (for trashable models), in the order 
+        they were trashed; the ids of the bundles that got deleted since, in
+        the order they were deleted; and a new watermark to pass in next time. 
+        Pass in no watermark to start out with every bundle there is. There's 
+        no need to know about earlier deletions then, so these are skipped.
+        
+        With a ``limit``, you get no more than that many new revisions, 
+        trashings and deletions each. Keep passing in the new watermark 
+        until nothing comes back to get the rest.
+        
+        Deletions are recorded as ``revisions.models.Tombstone`` rows by 
+        ``delete`` and ``delete_bundles_permanently``. These can't be
+        reported: 
+        
+        * revisions deleted in any other way, e.g. through ``QuerySet.delete``
+          or ``delete_revision``
+        * bundles restored from the trash, which look just like they did 
+          before they were trashed
         
-        return qs
+        Revisions are ordered on their comparator and then on their primary
+        key, so revisions that share a comparator don't get lost. This does 
+        assume revisions get committed in that order, too: a transaction that
+        commits a revision with a lower comparator than one a consumer has 
+        already seen (say, a long-running transaction with an ``auto_now`` 
+        comparator) goes unnoticed. Consumers that can't afford that should 
+        rewind the watermark by a little while now and then and deal with 
+        seeing some changes twice.
+        """
+        from revisions.models import Tombstone
+        opts = self.model._versioning
+        start, watermark = watermark is None, watermark or Watermark(None, None, None, None, None)
+        def limited(qs):
+            if limit:
+                return qs[:limit]
+            return qs
+
+        args = []
+        if watermark.comparator is not None:
+            after = Q(**{opts.comparator_name + '__gt': watermark.comparator})
+            if opts.comparator_name != opts.pk_name:
+                after |= Q(**{opts.comparator_name: watermark.comparator, 'pk__gt': watermark.pk})
+            args.append(after)
+        changes = list(limited(self._get_latest(*args).order_by(opts.comparator_name, 'pk')))
+        if changes:
+            comparator, pk = getattr(changes[-1], opts.comparator_name), changes[-1].pk
+        else:
+            comparator, pk = watermark.comparator, watermark.pk
+
+        # lots of bundles get trashed at the exact same time, 
+        # so the bundle id tells these apart
+        trashed_at, trashed_cid = watermark.trashed_at, watermark.trashed_cid
+        if opts.trashable:
+            args = []
+            if trashed_at is not None:
+                args.append(Q(trashed_at__gt=trashed_at) | Q(trashed_at=trashed_at, cid__gt=trashed_cid))
+            seen = set([obj.cid for obj in changes])
+            for obj in limited(self._get_latest(*args, _is_trash=True).order_by('trashed_at', 'cid')):
+                trashed_at, trashed_cid = obj.trashed_at, obj.cid
+                if obj.cid not in seen:
+                    changes.append(obj)
+
+        using = self._db or db_for_latest(self.model)
+        tombstones = Tombstone.objects.using(using).filter(model=Tombstone.get_label(self.model))
+        deleted, tombstone = [], watermark.tombstone
+        if start:
+            tombstone = tombstones.aggregate(latest=Max('pk'))['latest']
+        else:
+            if tombstone is not None:
+                tombstones = tombstones.filter(pk__gt=tombstone)
+            to_python = self.model._meta.get_field('cid').to_python
+            for obj in limited(tombstones.order_by('pk')):
+                deleted.append(to_python(obj.cid))
+                tombstone = obj.pk
+
+        return changes, deleted, Watermark(comparator, pk, trashed_at, trashed_cid, tombstone)
+
+    def _check_trashable(self):
+        if not self.model._versioning.trashable:
+            raise ImproperlyConfigured("%s does not have a trash bin. "
+                "Please subclass from revisions.models.TrashableModel." % self.model._meta.object_name)
+
+    @property
+    def live(self):
+        """ The latest revision of every bundle that isn't in the trash. """
+        self._check_trashable()
+        return self.current.filter(_is_trash=False)
+
+    @property
+    def trash(self):
+        """ The latest revision of every bundle in the trash. """
+        # Trashing a bundle trashes all of its revisions, so we can look for
+        # the latest revisions among trashed revisions only, which are few, 
+        # and have a partial index all to themselves.
+        self._check_trashable()
+        return self._get_latest(_is_trash=True)
+
+    def as_of(self, when):
+        """ 
+        What did all content look like at a certain point in time? Returns, 
+        for each bundle, the newest revision that was published (according to
+        ``Versioning.publication_date``, or the comparator if it's a date) 
+        on or before ``when``.
+        
+        For temporal models without a publication date, this is the revision
+        that was valid at that moment.
+        """
+        opts = self.model._versioning
+        if opts.temporal and not opts.publication_date:
+            return self.during(when, when)
+
+        date_name = opts.date_name
+        if not date_name:
+            raise ImproperlyConfigured("""Please specify which field counts as the publication
+                date for %s. You can do so inside a Versioning class. Read the docs 
+                for more info.""" % self.model._meta.object_name)
+
+        using = self._db or db_for_history(self.model)
+        qs = LatestQuerySet(self.model, using=using)
+        candidates = self._all_revisions(using).filter(**{date_name + '__lte': when})
+        return latest_per_bundle(qs, candidates)
+
+    def during(self, start, end):
+        """ Every revision of a temporal model that was valid at some point 
+        between ``start`` and ``end``. """
+        if not self.model._versioning.temporal:
+            raise ImproperlyConfigured("%s does not keep track of validity intervals. "
+                "Please subclass from revisions.models.TemporalModel." % self.model._meta.object_name)
+
+        qs = LatestQuerySet(self.model, using=self._db or db_for_history(self.model))
+        return qs.filter(valid_from__lte=end).filter(
+            models.Q(valid_to__gt=start) | models.Q(valid_to__isnull=True))
 
     def get_query_set(self):              
         # Django uses the default manager (which on versioned models is this one)
@@ -80,8 +294,22 @@ class LatestManager(models.Manager):
             return self.current
             
     
+class TrashManager(models.Manager):
+    """ ``trash`` and ``live`` for trashable models that aren't versioned, 
+    see ``revisions.models.TrashableModel``. (On versioned models, 
+    ``LatestManager`` takes care of this.) """
+
+    @property
+    def live(self):
+        return self.get_query_set().filter(_is_trash=False)
+
+    @property
+    def trash(self):
+        return self.get_query_set().filter(_is_trash=True)
+
 def trash_aware(cls):
-    for manager in cls._meta.abstract_managers:
-        manager[2].trash = manager[2].filter(_is_trash=True)
-        manager[2].live = manager[2].filter(_is_trash=False)
+    """ No longer needed: ``LatestManager.trash`` and ``LatestManager.live`` 
+    (and, for models that aren't versioned, ``TrashManager``, which 
+    ``TrashableModel`` comes with) build fresh querysets every time. 
+    Kept around for backwards compatibility. """
     return cls
\ No newline at end of file
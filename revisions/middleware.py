@@ -2,12 +2,17 @@
 
 # based on the FlatpageFallbackMiddleware
 
+import json
+import logging
 from django.http import Http404
 from django.conf import settings
 from django.core.urlresolvers import resolve, reverse, Resolver404
 from django.shortcuts import redirect
 from django.contrib.contenttypes.models import ContentType
 from revisions.models import VersionedModel
+from revisions.instrumentation import Collector
+
+logger = logging.getLogger('revisions.instrumentation')
 
 class VersionedModelRedirectMiddleware(object):
     def process_response(self, request, response):
@@ -28,4 +33,30 @@ class VersionedModelRedirectMiddleware(object):
                     # 3. redirect
                     return redirect(reverse('admin:%s_%s_change' % (app, model), args=[obj.pk]))
 
-        return response
\ No newline at end of file
+        return response
+
+class RevisionsInstrumentationMiddleware(object):
+    """
+    Aggregates how much time and how many queries each revision operation 
+    took during a request (see ``revisions.instrumentation``), and logs 
+    the totals to the ``revisions.instrumentation`` logger. With 
+    ``REVISIONS_INSTRUMENTATION_HEADER = True`` in your settings, the totals
+    are also added to the response as an ``X-Revisions-Stats`` header.
+    """
+    
+    def process_request(self, request):
+        request._revisions_collector = Collector().start()
+    
+    def process_response(self, request, response):
+        collector = getattr(request, '_revisions_collector', None)
+        if collector is None:
+            return response
+        
+        collector.stop()
+        summary = collector.summary()
+        if summary:
+            stats = json.dumps(summary, sort_keys=True)
+            logger.debug('%s %s', request.path, stats)
+            if getattr(settings, 'REVISIONS_INSTRUMENTATION_HEADER', False):
+                response['X-Revisions-Stats'] = stats
+        return response
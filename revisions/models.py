@@ -2,15 +2,24 @@
 
 import uuid
 import difflib
+import hashlib
 from datetime import date
-from django.db import models
+from django.db import models, transaction, connections
 from django.utils.translation import ugettext as _
-from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.exceptions import ImproperlyConfigured, ValidationError, NON_FIELD_ERRORS
 from django.db import IntegrityError
-from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import class_prepared, pre_save, post_save
+from django.utils import timezone
+from django.utils.encoding import smart_str
 from django.contrib.auth.models import User
 from django.utils.translation import ugettext_lazy as _
 from revisions import managers, utils
+from revisions.signals import send, revision_created, revision_changed, bundle_trashed, bundle_restored, bundle_deleted
+from revisions.fields import BundleIdField
+from revisions.instrumentation import instrumented
+from revisions.options import VersioningOptions
+from revisions.registry import registry
+from revisions.routers import db_for_latest, db_for_history, db_for_write
 import inspect
 
 # the crux of all errors seems to be that, with VersionedBaseModel, 
@@ -23,34 +32,36 @@ import inspect
 # model to ``django-revisions`` and have an AutoField not named
 # ``vid``.
 
+class RevisionConflict(IntegrityError):
+    """ Somebody else saved a new revision of this bundle in the meantime,
+    see ``SequencedModel``. """
+    pass
+
 class VersionedModelBase(models.Model, utils.ClonableMixin):
+    # Everything we need to know about how a model is versioned gets
+    # computed once, when the model class is prepared, and lives in
+    # ``_versioning`` (see ``revisions.options``.)
     @classmethod
     def get_base_model(cls):
-        base = cls
-        while isinstance(base._meta.pk, models.OneToOneField):
-            base = base._meta.pk.rel.to
-        return base    
+        return cls._versioning.base_model
 
     @property
     def base_model(self):
-        return self.get_base_model()
+        return self._versioning.base_model
 
     @property
     def pk_name(self):
-        return self.base_model._meta.pk.attname
+        return self._versioning.pk_name
 
     # For UUIDs in particular, we need a way to know the order of revisions
     # e.g. through a ``changed`` datetime field.
     @classmethod
     def get_comparator_name(cls):
-        if hasattr(cls.Versioning, 'comparator'):
-            return cls.Versioning.comparator
-        else:
-            return cls.get_base_model()._meta.pk.attname
+        return cls._versioning.comparator_name
 
     @property
     def comparator_name(self):
-        return self.get_comparator_name()
+        return self._versioning.comparator_name
 
     @property
     def comparator(self):
@@ -58,55 +69,78 @@ class VersionedModelBase(models.Model, utils.ClonableMixin):
 
     @classmethod
     def get_implementations(cls):
-        models = [contenttype.model_class() for contenttype in ContentType.objects.all()]
-        return [model for model in models if isinstance(model, cls)]
+        return registry.get_models(cls)
 
     @property
     def _base_model(self):
-        base = self
-        while isinstance(base._meta.pk, models.OneToOneField):
-            base = base._meta.pk.rel.to
-        return base    
+        return self._versioning.base_model
 
     @property
     def _base_table(self):
-        return self._base_model._meta.db_table
+        return self._versioning.base_table
+
+    def __init__(self, *vargs, **kwargs):
+        super(VersionedModelBase, self).__init__(*vargs, **kwargs)
+        self._remember_values()
 
     # content bundle id
-    cid = models.CharField(max_length=36, editable=False, null=True, db_index=True, verbose_name=_('ID'))
+    cid = BundleIdField(editable=False, null=True, db_index=True, verbose_name=_('ID'))
     
     # managers
     latest = managers.LatestManager()
     objects = models.Manager()
 
     # all related revisions, plus easy shortcuts to the previous and next revision
-    def get_revisions(self):
-        qs = self.__class__.objects.filter(cid=self.cid).order_by(self.comparator_name)
+    @instrumented('get_revisions')
+    def get_revisions(self, using=None):
+        """ All revisions in this bundle, oldest first. Large fields (see 
+        ``Versioning.history_fields``) only get loaded when you access them, 
+        except on ``prev`` and ``next``. """
+        using = using or db_for_history(self.__class__)
+        full = self.__class__.objects.using(using).filter(cid=self.cid).order_by(self.comparator_name)
+        if self._versioning.history_defer:
+            qs = full.defer(*self._versioning.history_defer)
+        else:
+            qs = full._clone()
         
         try:
-            qs.prev = qs.filter(**{self.comparator_name + '__lt': self.comparator}).order_by('-' + self.comparator_name)[0]
+            qs.prev = full.filter(**{self.comparator_name + '__lt': self.comparator}).order_by('-' + self.comparator_name)[0]
         except IndexError:
             qs.prev = None
         try:
-            qs.next = qs.filter(**{self.comparator_name + '__gt': self.comparator})[0]
+            qs.next = full.filter(**{self.comparator_name + '__gt': self.comparator})[0]
         except IndexError:
             qs.next = None
         
         return qs
     
     def check_if_latest_revision(self):
-        return self.comparator >= max([version.comparator for version in self.get_revisions()])
+        latest = self.__class__.objects.using(db_for_latest(self.__class__)).filter(cid=self.cid) \
+            .aggregate(latest=models.Max(self.comparator_name))['latest']
+        return self.comparator >= latest
     
     @classmethod
-    def fetch(cls, criterion):
-        if isinstance(criterion, int) or isinstance(criterion, str):
-            return cls.objects.get(pk=criterion)
+    def fetch(cls, criterion, bundle=None):
+        """
+        Fetches a revision by primary key, or the newest revision that was
+        published on or before a certain date. Pass along a bundle id to only
+        look at the revisions in that bundle.
+        """
+        objects = cls.objects.using(db_for_history(cls))
+        if isinstance(criterion, (int, long, basestring)):
+            return objects.get(pk=criterion)
         elif isinstance(criterion, models.Model):
             return criterion
         elif isinstance(criterion, date):
-            pub_date = cls.Versioning.publication_date
-            if pub_date:
-                return cls.objects.filter(**{pub_date + '__lte': criterion}).order('-' + self.comparator_name)[0]
+            date_name = cls._versioning.date_name
+            if date_name:
+                qs = objects.filter(**{date_name + '__lte': criterion})
+                if bundle:
+                    qs = qs.filter(cid=bundle)
+                try:
+                    return qs.order_by('-' + cls.get_comparator_name())[0]
+                except IndexError:
+                    raise cls.DoesNotExist("No %s was published on or before %s." % (cls._meta.object_name, criterion))
             else:
                 raise ImproperlyConfigured("""Please specify which field counts as the publication
                     date for this model. You can do so inside a Versioning class. Read the docs 
@@ -115,17 +149,22 @@ class VersionedModelBase(models.Model, utils.ClonableMixin):
             raise TypeError("Can only fetch an object using a primary key, a date or a datetime object.")
 
     def revert_to(self, criterion):
-        revert_to_obj = self.__class__.fetch(criterion)
+        revert_to_obj = self.__class__.fetch(criterion, bundle=self.cid)
     
         # You can only revert a model instance back to a previous instance.
         # Not any ol' object will do, and we check for that.
         if revert_to_obj.pk not in self.get_revisions().values_list('pk', flat=True):
             raise IndexError("Cannot revert to a primary key that is not part of the content bundle.")
         else:
+            # for sequenced models, the revert happens on top of this revision
+            if self._versioning.sequenced:
+                revert_to_obj.vseq = self.vseq
             return revert_to_obj.revise()
             
-    def get_latest_revision(self):
-        return self.get_revisions().order_by('-' + self.comparator_name)[0]
+    @instrumented('get_latest_revision')
+    def get_latest_revision(self, using=None):
+        using = using or db_for_latest(self.__class__)
+        return self.__class__.objects.using(using).filter(cid=self.cid).order_by('-' + self.comparator_name)[0]
     
     def make_current_revision(self):
         if not self.check_if_latest_revision():
@@ -143,32 +182,69 @@ class VersionedModelBase(models.Model, utils.ClonableMixin):
         return lDiffClass.diff_prettyHtml(lDiffs)
         
         
-    def _get_unique_checks(self, exclude=[]):
-        # for parity with Django's unique_together notation shortcut
-        def parse_shortcut(unique_together):
-            unique_together = tuple(unique_together)
-            if len(unique_together) and isinstance(unique_together[0], basestring):
-                unique_together = (unique_together, )    
-            return unique_together
-        
-        # Django actually checks uniqueness for a single field in the very same way it
-        # does things for unique_together, something we happily take advantage of
-        unique = tuple([(field,) for field in getattr(self.Versioning, 'unique', ())])
-        unique_together = \
-            unique + \
-            parse_shortcut(getattr(self.Versioning, 'unique_together', ())) + \
-            parse_shortcut(getattr(self._meta, 'unique_together', ()))
-        
-        model = self.__class__()
-        model._meta.unique_together = unique_together
-        return models.Model._get_unique_checks(model, exclude)          
+    def _get_unique_checks(self, exclude=None):
+        return self._versioning.get_unique_checks(exclude)
 
     def _get_attribute_history(self, name):
         if self.__dict__.get(name, False):
-            return [(version.__dict__[name], version) for version in self.get_revisions()]
+            revisions = self.get_revisions()
+            if name in self._versioning.history_defer:
+                revisions = revisions.defer(None).defer(*[field for field 
+                    in self._versioning.history_defer if field != name])
+            # tracked models know in which revisions a field actually changed
+            if self._versioning.tracked:
+                connection = connections[revisions.db]
+                field = self._meta.get_field('vchanged')
+                column = '%s.%s' % (connection.ops.quote_name(field.model._meta.db_table), 
+                    connection.ops.quote_name(field.column))
+                revisions = revisions.extra(where=['(%s IS NULL OR %s != 0)' % (column, 
+                    connection.ops.combine_expression('&', [column, '%s']))], 
+                    params=[self._versioning.get_changed_mask([name])])
+            return [(version.__dict__[name], version) for version in revisions]
         else:
             raise AttributeError(name)
 
+    def _get_tracked_values(self):
+        # deferred fields aren't in ``__dict__`` until they're accessed
+        return dict([(field.attname, self.__dict__[field.attname]) for field 
+            in self._versioning.tracked_fields if field.attname in self.__dict__])
+
+    def _remember_values(self):
+        # for dirty tracking, tracked models remember the values they started out with
+        if self._versioning.tracked:
+            self._loaded_values = self._get_tracked_values()
+
+    def get_dirty_fields(self):
+        """ The names of the fields that changed since this 
+        instance was loaded from or saved to the database. Models that don't
+        keep track of changes (see ``ChangeTrackingModel``) don't remember
+        what they were loaded with, so for them that's every field. """
+        values = self._get_tracked_values()
+        if not self._versioning.tracked:
+            return [field.name for field in self._versioning.tracked_fields if field.attname in values]
+        return [field.name for field in self._versioning.tracked_fields if 
+            field.attname in self._loaded_values and 
+            field.attname in values and
+            values[field.attname] != self._loaded_values[field.attname]]
+
+    def get_changed_fields(self):
+        """ For tracked models, the names of the fields that changed 
+        compared to the previous revision. """
+        if not self._versioning.tracked:
+            raise ImproperlyConfigured("%s does not keep track of changed fields. Please "
+                "subclass from revisions.models.ChangeTrackingModel." % self._meta.object_name)
+        if self.vchanged is None:
+            return [field.name for field in self._versioning.tracked_fields]
+        return self._versioning.get_changed_names(self.vchanged)
+
+    def _compare_to(self, revision):
+        """ The names of the fields that differ from another revision. """
+        # starting from the latest revision, dirty tracking tells us what changed
+        if revision.pk == self.pk:
+            return self.get_dirty_fields()
+        return [field.name for field in self._versioning.tracked_fields if 
+            getattr(self, field.attname) != getattr(revision, field.attname)]
+
     def _get_related_objects(self, relatedmanager):
         """ This method extends a regular related-manager by also including objects
         that are related to other versions of the same content, instead of just to
@@ -189,8 +265,11 @@ class VersionedModelBase(models.Model, utils.ClonableMixin):
         #
         # By all means, I'd welcome suggestions for prettier code.
         ref_name = self._meta._name_map[related_model_name][0].field.name
-        pks = [story.pk for story in self.get_revisions()]        
-        objs = related_model._default_manager.filter(**{ref_name + '__in': pks})
+        # read from the primary database, like the related manager itself,
+        # so we don't mix in revisions a replica hasn't caught up with yet
+        using = db_for_write(self.__class__, self)
+        pks = self.get_revisions(using=using).values('pk')
+        objs = related_model._default_manager.db_manager(using).filter(**{ref_name + '__in': pks})
         
         return objs
     
@@ -220,24 +299,261 @@ class VersionedModelBase(models.Model, utils.ClonableMixin):
         This method allows you to clear out certain fields in the model that are
         specific to each revision, like a log message.
         """
-        for field in self.Versioning.clear_each_revision:
+        for field in self._versioning.clear_each_revision:
             super(VersionedModelBase, self).__setattr__(field, '')
 
-    def validate_bundle(self):
+    @classmethod
+    def validate_bundles(cls, revisions, using=None):
+        """
+        Checks the per-bundle uniqueness constraints from ``Versioning.unique`` 
+        and ``Versioning.unique_together`` for any number of revisions at once.
+
+        All constraints for all revisions are compiled into a single query 
+        against the latest revisions of every *other* bundle, so a revision 
+        never clashes with older revisions of its own or of other bundles. 
+        Revisions in the set are checked against each other too.
+        """
+        checks = cls._versioning.bundle_unique_checks
+        if not checks:
+            return
+
+        # Just like Django does, we skip checks that involve empty values.
+        lookups = []
+        for revision in revisions:
+            for check in checks:
+                lookup = {}
+                for name in check:
+                    value = getattr(revision, cls._meta.get_field(name).attname)
+                    if value is None:
+                        break
+                    lookup[name] = value
+                else:
+                    lookups.append((revision, check, lookup))
+        
+        if not lookups:
+            return
+        
+        query = models.Q()
+        for revision, check, lookup in lookups:
+            if revision.cid:
+                query |= models.Q(**lookup) & ~models.Q(cid=revision.cid)
+            else:
+                query |= models.Q(**lookup)
+        
+        fields = sorted(set([name for check in checks for name in check]))
+        # checked against the primary database, because replicas may lag behind
+        using = using or db_for_write(cls)
+        taken = list(cls.latest.db_manager(using).current.filter(query).values('cid', *fields))
+        
+        errors = {}
+        seen = {}
+        for revision, check, lookup in lookups:
+            values = tuple([lookup[name] for name in check])
+            clashes = [row for row in taken if row['cid'] != revision.cid and 
+                tuple([row[name] for name in check]) == values]
+            # two new revisions in the same batch may clash too
+            other = seen.setdefault((check, values), revision)
+            if clashes or (other is not revision and (other.cid != revision.cid or not other.cid)):
+                key = len(check) == 1 and check[0] or NON_FIELD_ERRORS
+                errors.setdefault(key, []).append(revision.unique_error_message(cls, check))
+        
+        if errors:
+            # replace ValidationError with IntegrityError because this is what users will expect
+            raise IntegrityError(ValidationError(errors))
+
+    @instrumented('validate_bundle')
+    def validate_bundle(self, using=None):
         # uniqueness constraints per bundle can't be checked at the database level, 
         # which means we'll have to do so in the save method
-        if getattr(self.Versioning, 'unique_together', None) or getattr(self.Versioning, 'unique', None):
-            # replace ValidationError with IntegrityError because this is what users will expect
-            try:
-                self.validate_unique()
-            except ValidationError, error:
-                raise IntegrityError(error)
+        self.__class__.validate_bundles([self], using=using or db_for_write(self.__class__, self))
+
+    def compute_content_hash(self):
+        """ A hash of the content of this revision: every field except for
+        bookkeeping like the primary key, bundle id, comparator, last change
+        and user, and except for fields that are cleared on each revision. """
+        digest = hashlib.sha1()
+        for field in self._versioning.content_fields:
+            if getattr(self, field.attname) is None:
+                value = '\0'
+            else:
+                value = smart_str(field.value_to_string(self))
+            digest.update('%s\0%s\0' % (field.attname, value))
+        return digest.hexdigest()
 
+    def has_same_content(self, other):
+        if self._versioning.hashed and self.vhash and other.vhash:
+            return self.vhash == other.vhash
+        else:
+            return self.compute_content_hash() == other.compute_content_hash()
+
+    @instrumented('revise')
     def revise(self):
-        self.validate_bundle()
+        # no need to validate here, saving the new revision does so
         if not self.pk:
             return self.save()
-        return self.clone()
+        
+        # compared against the primary database, because replicas may lag behind
+        if self._versioning.hashed or self._versioning.tracked:
+            latest = self.get_latest_revision(using=db_for_write(self.__class__, self))
+
+        # no need for a new revision if nothing changed since the last one
+        if self._versioning.hashed:
+            if latest.vhash == self.compute_content_hash():
+                return latest
+
+        if self._versioning.tracked:
+            self.vchanged = self._versioning.get_changed_mask(self._compare_to(latest))
+
+        if not self._versioning.follow:
+            return self.clone()
+
+        # related content gets revised along with this revision, all or nothing
+        using = db_for_write(self.__class__, self)
+        with utils.atomic(using):
+            old_pk = self.pk
+            revision = self.clone()
+            self.__class__.revise_followed({old_pk: revision.pk}, using)
+        return revision
+
+    @classmethod
+    def get_followed_relations(cls):
+        """ The relations in ``Versioning.follow``, as ``(model, foreign key)`` pairs. """
+        related_objects = dict([(related.get_accessor_name(), related) 
+            for related in cls._meta.get_all_related_objects()])
+        relations = []
+        for name in cls._versioning.follow:
+            related = related_objects.get(name)
+            if related is None or related.model not in registry:
+                raise ImproperlyConfigured("%s can't follow %s, which is not a relation "
+                    "to a versioned model." % (cls.__name__, name))
+            if related.model._meta.parents:
+                raise ImproperlyConfigured("%s can't follow %s, because revisions of models "
+                    "with concrete inheritance can't be inserted in bulk." % (cls.__name__, name))
+            relations.append((related.model, related.field))
+        return relations
+
+    @classmethod
+    def revise_followed(cls, revisions, using=None):
+        """
+        Adds a new revision to every bundle of related content (see 
+        ``Versioning.follow``) whose latest revision refers to one of the 
+        revisions in ``revisions``, a dictionary of old primary keys to the 
+        primary keys of their new revisions. The new revisions refer to the 
+        new revisions instead, and so on down the graph.
+        
+        Every relation takes a fixed number of queries, however many 
+        revisions are involved: the new revisions get inserted in bulk, 
+        as do their many-to-many relations.
+        """
+        using = using or db_for_write(cls)
+        for model, field in cls.get_followed_relations():
+            opts = model._versioning
+            objects = model.objects.using(using)
+            bundles = objects.filter(**{field.name + '__in': revisions.keys()}).values('cid')
+            children = list(model.latest.db_manager(using)._get_latest(cid__in=bundles) \
+                .filter(**{field.name + '__in': revisions.keys()}))
+            if not children:
+                continue
+
+            now = timezone.now()
+            duplicates = []
+            for child in children:
+                duplicate = model()
+                for f in model._meta.fields:
+                    if f.name not in opts.clone_skip_fields:
+                        setattr(duplicate, f.attname, getattr(child, f.attname))
+                setattr(duplicate, field.attname, revisions[getattr(child, field.attname)])
+                if opts.sequenced:
+                    duplicate.vseq = (child.vseq or 0) + 1
+                if opts.temporal:
+                    duplicate.valid_from = now
+                    duplicate.valid_to = None
+                if opts.hashed:
+                    duplicate.vhash = duplicate.compute_content_hash()
+                if opts.tracked:
+                    duplicate.vchanged = opts.get_changed_mask([field.name])
+                duplicates.append(duplicate)
+            objects.bulk_create(duplicates)
+            if opts.temporal:
+                objects.filter(pk__in=[child.pk for child in children]).update(valid_to=now)
+
+            # bulk inserts don't tell us the new primary keys, but the new 
+            # revisions are the only ones that refer to the new revisions upstream
+            originals = dict([(child.cid, child.pk) for child in children])
+            created = dict([(originals[duplicate.cid], duplicate) for duplicate 
+                in objects.filter(**{field.name + '__in': revisions.values()})])
+
+            for m2m in model._meta.many_to_many:
+                through = m2m.rel.through
+                if not through._meta.auto_created:
+                    continue
+                source = through._meta.get_field(m2m.m2m_field_name()).attname
+                target = through._meta.get_field(m2m.m2m_reverse_field_name()).attname
+                rows = through._default_manager.using(using) \
+                    .filter(**{source + '__in': created.keys()}).values_list(source, target)
+                through._default_manager.using(using).bulk_create([through(**{
+                    source: created[pk].pk, target: related_pk}) for pk, related_pk in rows])
+
+            for old_pk, duplicate in created.items():
+                send(revision_created, model, instance=duplicate, cid=duplicate.cid, 
+                    old_pk=old_pk, new_pk=duplicate.pk, using=using)
+
+            if opts.follow:
+                model.revise_followed(dict([(old_pk, duplicate.pk) 
+                    for old_pk, duplicate in created.items()]), using)
+
+    @instrumented('save_in_place')
+    def save_in_place(self):
+        """
+        Saves small changes (fixing a typo, changing a couple of words) to this
+        revision in place rather than creating a new revision. This goes through
+        ``save`` like any other save, so overrides and the ``pre_save`` and 
+        ``post_save`` signals still get their turn, but there's no cloning or 
+        copying of many-to-many relations involved. For models that keep track
+        of changes (see ``ChangeTrackingModel``), only the columns that changed 
+        since this instance was loaded get written.
+        """
+        if not self.pk:
+            return self.save()
+
+        self._in_place = True
+        try:
+            self.save()
+        finally:
+            self._in_place = False
+        return self
+
+    def _save_in_place(self, using):
+        # the tail end of ``save_in_place``, once ``save`` overrides 
+        # have had their say about derived fields
+        dirty = self.get_dirty_fields()
+        if not dirty:
+            return
+
+        checked = set([name for check in self._versioning.bundle_unique_checks for name in check])
+        if checked.intersection(dirty):
+            self.validate_bundle(using=using)
+
+        origin = self.__class__
+        if origin._deferred:
+            origin = origin._meta.proxy_for_model
+        pre_save.send(sender=origin, instance=self, raw=False, using=using)
+
+        names = set(dirty)
+        names.update([field.name for field in self._meta.fields if getattr(field, 'auto_now', False)])
+        if self._versioning.hashed:
+            self.vhash = self.compute_content_hash()
+            names.add('vhash')
+        if self._versioning.tracked:
+            self.vchanged = self._versioning.get_changed_mask(self.get_changed_fields() + dirty)
+            names.add('vchanged')
+
+        values = dict([(name, self._meta.get_field(name).pre_save(self, False)) for name in names])
+        self.__class__.objects.using(using).filter(pk=self.pk).update(**values)
+        self._remember_values()
+        post_save.send(sender=origin, instance=self, created=False, raw=False, using=using)
+        send(revision_changed, self.__class__, instance=self, cid=self.cid, 
+            pk=self.pk, fields=dirty, using=using)
 
     def save(self, *vargs, **kwargs):    
         # The first revision of a piece of content won't have a bundle id yet, 
@@ -246,19 +562,97 @@ class VersionedModelBase(models.Model, utils.ClonableMixin):
         # 
         # (Note for smart alecks: Django chokes on using super/save() more than
         # once in the save method, so doing a preliminary save to get the PK
-        # and using that value for a bundle ID is rather hard.)
-        if not self.cid:
+        # and using that value for a bundle ID is rather hard. Integer bundle 
+        # ids do just that, but with an update after the save instead.)
+        adding = self._state.adding or self.pk is None
+
+        # revisions read from a replica or from the history database
+        # get saved to the primary database (see ``revisions.routers``)
+        if len(vargs) < 3:
+            kwargs['using'] = kwargs.get('using') or db_for_write(self.__class__, self)
+            using = kwargs['using']
+        else:
+            using = vargs[2]
+
+        if getattr(self, '_in_place', False) and not adding:
+            return self._save_in_place(using)
+
+        # a new revision follows upon the revision it was cloned from
+        sequenced = self._versioning.sequenced and adding
+        if sequenced:
+            self.vseq = self.cid and (self.vseq or 0) + 1 or 1
+
+        if not self.cid and self._versioning.bundle_id != 'integer':
             self.cid = uuid.uuid4().hex
 
-        self.validate_bundle()
-        super(VersionedModelBase, self).save(*vargs, **kwargs)
+        temporal = self._versioning.temporal and adding
+        if temporal:
+            self.valid_from = timezone.now()
+            self.valid_to = None
+
+        if self._versioning.hashed:
+            self.vhash = self.compute_content_hash()
+
+        # everything changes in the first revision of a bundle
+        if self._versioning.tracked and not self.pk and self.vchanged is None:
+            self.vchanged = self._versioning.get_changed_mask(
+                [field.name for field in self._versioning.tracked_fields])
+
+        self.validate_bundle(using=using)
+        if sequenced:
+            self._save_sequenced(*vargs, **kwargs)
+        else:
+            super(VersionedModelBase, self).save(*vargs, **kwargs)
+
+        if not self.cid:
+            self.cid = self.pk
+            self.__class__.objects.using(using).filter(pk=self.pk).update(cid=self.cid)
+
+        # a new revision closes the validity interval of the revision it replaces
+        if temporal:
+            self.__class__.objects.using(using).filter(cid=self.cid, valid_to__isnull=True) \
+                .exclude(pk=self.pk).update(valid_to=self.valid_from)
+
+        self._remember_values()
+
+        # ``clone`` sends its own signal, once many-to-many relations are copied too
+        if adding and not getattr(self, '_cloning', False):
+            send(revision_created, self.__class__, instance=self, cid=self.cid, 
+                old_pk=None, new_pk=self.pk, using=using)
         
+    def _save_sequenced(self, *vargs, **kwargs):
+        # The unique index on (cid, vseq) makes sure only one new revision can
+        # follow upon any given revision. The savepoint keeps the transaction
+        # usable after a conflict, e.g. to retry.
+        using = kwargs.get('using') or vargs[2]
+        sid = transaction.savepoint(using=using)
+        try:
+            super(VersionedModelBase, self).save(*vargs, **kwargs)
+        except IntegrityError, e:
+            transaction.savepoint_rollback(sid, using=using)
+            if self.__class__.objects.using(using).filter(cid=self.cid, vseq=self.vseq).exists():
+                raise RevisionConflict(_("Revision %(vseq)i of %(cid)s already exists.") % {
+                    'vseq': self.vseq, 'cid': self.cid})
+            raise
+        else:
+            transaction.savepoint_commit(sid, using=using)
+
     def delete_revision(self, *vargs, **kwargs):
         super(VersionedModelBase, self).delete(*vargs, **kwargs)
     
     def delete(self, *vargs, **kwargs):
-        for revision in self.get_revisions():
+        if not vargs:
+            kwargs['using'] = kwargs.get('using') or db_for_write(self.__class__, self)
+        using = kwargs.get('using') or vargs[0]
+        # trashing works on whole bundles to begin with
+        if self._versioning.trashable:
+            return super(VersionedModelBase, self).delete(using=using)
+        # full rows rather than ``get_revisions``, whose deferred instances would 
+        # send ``pre_delete`` and ``post_delete`` with a deferred class as sender
+        for revision in self.__class__.objects.using(using).filter(cid=self.cid):
             revision.delete_revision(*vargs, **kwargs)
+        Tombstone.bury(self.__class__, [self.cid], using)
+        send(bundle_deleted, self.__class__, cids=[self.cid], using=using)
 
     class Meta:
         abstract = True
@@ -279,32 +673,193 @@ class VersionedModel(VersionedModelBase):
 class TrashableModel(models.Model):
     """ Users wanting a version history may also expect a trash bin
     that allows them to recover deleted content, as is e.g. the
-    case in WordPress. This is that thing. """
+    case in WordPress. This is that thing. 
+    
+    Trashing, restoring and permanently deleting content happens for whole 
+    bundles at a time (or, for models that aren't versioned, for single 
+    objects), with a single query, no matter how many revisions are involved. 
+    The ``*_bundles`` class methods do so for any number of bundles at once.
+    
+    Content that was already in the trash when ``trashed_at`` got added 
+    will need its ``trashed_at`` values filled in to show up in 
+    ``revisions.views.trashcan``. """
     
     _is_trash = models.BooleanField(db_column='is_trash', default=False, editable=False)
+    trashed_at = models.DateTimeField(_('Trashed at'), null=True, editable=False)
+
+    # ``objects.live`` and ``objects.trash``, for models that aren't versioned;
+    # on versioned models, ``VersionedModelBase.objects`` takes precedence
+    # and ``latest.live`` and ``latest.trash`` take care of this
+    objects = managers.TrashManager()
     
     @property
     def is_trash(self):
         return self._is_trash
     
     def get_content_bundle(self):
+        # the bundle gets trashed or restored as a whole, so it has to 
+        # come from the database those writes go to
         if isinstance(self, VersionedModelBase):
-            return self.get_revisions()
+            return self.get_revisions(using=db_for_write(self.__class__, self))
         else:
             return [self]        
+
+    def get_bundle_key(self):
+        if isinstance(self, VersionedModelBase):
+            return self.cid
+        else:
+            return self.pk
+
+    @classmethod
+    def _get_bundles(cls, keys, using=None):
+        # every row for these bundles, or for these objects if we're not versioned
+        if issubclass(cls, VersionedModelBase):
+            lookup = 'cid__in'
+        else:
+            lookup = 'pk__in'
+        using = using or db_for_write(cls)
+        return cls._base_manager.db_manager(using).filter(**{lookup: list(keys)})
+
+    @classmethod
+    def trash_bundles(cls, keys, using=None):
+        keys, using = list(keys), using or db_for_write(cls)
+        trashed_at = timezone.now()
+        cls._get_bundles(keys, using).update(_is_trash=True, trashed_at=trashed_at)
+        send(bundle_trashed, cls, cids=keys, trashed_at=trashed_at, using=using)
+        return trashed_at
+
+    @classmethod
+    def restore_bundles(cls, keys, using=None):
+        keys, using = list(keys), using or db_for_write(cls)
+        cls._get_bundles(keys, using).update(_is_trash=False, trashed_at=None)
+        send(bundle_restored, cls, cids=keys, using=using)
+
+    @classmethod
+    def delete_bundles_permanently(cls, keys, using=None):
+        keys, using = list(keys), using or db_for_write(cls)
+        cls._get_bundles(keys, using).delete()
+        if issubclass(cls, VersionedModelBase):
+            Tombstone.bury(cls, keys, using)
+        send(bundle_deleted, cls, cids=keys, using=using)
     
-    def delete(self):
+    def delete(self, using=None):
         """
         It makes no sense to trash individual revisions: either you keep a version history or you don't.
         If you want to undo a revision, you should use obj.revert_to(preferred_revision) instead.
         """
-        for obj in self.get_content_bundle():
-            obj._is_trash = True
-            obj.save()
+        self.trashed_at = self.__class__.trash_bundles([self.get_bundle_key()], using)
+        self._is_trash = True
+
+    def restore(self, using=None):
+        self.__class__.restore_bundles([self.get_bundle_key()], using)
+        self._is_trash = False
+        self.trashed_at = None
     
-    def delete_permanently(self):    
-        for obj in self.get_content_bundle():
-            super(TrashableModel, obj).delete()
+    def delete_permanently(self, using=None):    
+        self.__class__.delete_bundles_permanently([self.get_bundle_key()], using)
     
     class Meta:
-        abstract = True
\ No newline at end of file
+        abstract = True
+
+class TemporalModel(models.Model):
+    """ Keeps track of the time span during which each revision was the
+    latest one, like a type 2 slowly changing dimension in data warehousing.
+    
+    Saving a new revision (through ``save``, ``revise`` or ``revert_to``) 
+    opens its validity interval and closes the interval of the revision it
+    replaces. The latest revisions are simply those that are still valid, 
+    and a point in time falls within exactly one interval per bundle, which 
+    allows for plain range scans on an index rather than group-by subqueries.
+    
+    Revisions that already exist when you add this mixin to a model will
+    need their ``valid_from`` and ``valid_to`` values filled in. """
+    
+    valid_from = models.DateTimeField(_('Valid from'), null=True, editable=False)
+    valid_to = models.DateTimeField(_('Valid to'), null=True, editable=False)
+    
+    class Meta:
+        abstract = True
+
+class ChangeTrackingModel(models.Model):
+    """ Records which fields changed in each revision compared to the previous
+    one, so that ``<field>_history`` only returns the revisions where that field 
+    actually changed and so that diffs can skip fields that didn't change. 
+    
+    The changed fields are stored as a bitmask, one bit per field, in the order
+    the fields are declared in, so add new fields at the end of the model. """
+
+    vchanged = models.BigIntegerField(null=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+class ContentHashModel(models.Model):
+    """ Stores a hash of the content of each revision (see 
+    ``VersionedModelBase.compute_content_hash``), so that ``revise`` can skip
+    saves that don't change anything, and so that you can tell whether two 
+    revisions are the same by comparing a single column. """
+    
+    vhash = models.CharField(max_length=40, null=True, editable=False, db_index=True)
+    
+    class Meta:
+        abstract = True
+
+class SequencedModel(models.Model):
+    """ Numbers the revisions in a bundle, so that concurrent edits can't 
+    both end up as the latest revision. 
+    
+    Every new revision gets the sequence number of the revision it was 
+    cloned from plus one, and a unique index on ``(cid, vseq)`` makes sure
+    that only one of them can do so. When two editors revise the same
+    revision at once, the second one to save gets a ``RevisionConflict``
+    instead of quietly overwriting the first, without any locking. 
+    ``revisions.utils.retry_on_conflict`` helps with trying again on top of
+    the new latest revision.
+    
+    Revisions that already exist when you add this mixin to a model will
+    need their ``vseq`` values filled in. """
+
+    vseq = models.PositiveIntegerField(null=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+class Tombstone(models.Model):
+    """ A bundle that got deleted, permanently or from a model without a 
+    trash bin, so that feeds of changes (``LatestManager.changed_since``)
+    can tell their consumers about it. """
+
+    # inserts per query, so as to stay within SQLite's limit of 999 parameters
+    batch_size = 250
+
+    model = models.CharField(max_length=100, db_index=True)
+    cid = models.CharField(max_length=255)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def get_label(cls, model):
+        # with concrete inheritance, bundles belong to the base model
+        opts = model._versioning.base_model._meta
+        return '%s.%s' % (opts.app_label, opts.object_name.lower())
+
+    @classmethod
+    def bury(cls, model, cids, using):
+        label = cls.get_label(model)
+        tombstones = [cls(model=label, cid=unicode(cid)) for cid in cids]
+        for i in range(0, len(tombstones), cls.batch_size):
+            cls.objects.using(using).bulk_create(tombstones[i:i + cls.batch_size])
+
+def register_versioned_model(sender, **kwargs):
+    if issubclass(sender, VersionedModelBase):
+        sender._versioning = VersioningOptions(sender, 
+            trashable=issubclass(sender, TrashableModel),
+            temporal=issubclass(sender, TemporalModel),
+            hashed=issubclass(sender, ContentHashModel),
+            tracked=issubclass(sender, ChangeTrackingModel),
+            sequenced=issubclass(sender, SequencedModel))
+        # proxies share their concrete model's table and bundles,
+        # so only the concrete model gets registered
+        if not sender._meta.proxy:
+            registry.register(sender)
+
+class_prepared.connect(register_versioned_model)
\ No newline at end of file
@@ -0,0 +1,255 @@
+# encoding: utf-8
+
+"""
+Versioning metadata, computed once per model class.
+
+Just like Django keeps everything it knows about a model in ``Model._meta``,
+``django-revisions`` keeps everything it knows about how a model is versioned
+in ``Model._versioning``. These values are used on every save, every revision
+and every query for the latest revisions, so rather than walking the
+inheritance chain and scanning through fields over and over again, we
+figure it all out once, when Django prepares the model class.
+"""
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from revisions.indexes import Index
+from revisions.utils import CreationDateTimeField
+
+# bookkeeping fields that say something about a revision rather than about its content
+REVISION_FIELDS = ('cid', 'vid', 'vdatetime', 'vuser', 'vhash', 'vchanged', 'vseq', '_is_trash', 'trashed_at')
+
+# fields that get left out of history listings by default
+LARGE_FIELDS = tuple([field for field in (models.TextField, getattr(models, 'BinaryField', None)) if field])
+
+def parse_shortcut(unique_together):
+    """ For parity with Django's unique_together notation shortcut,
+    e.g. ``unique_together = ("title", "slug")``. """
+    unique_together = tuple(unique_together)
+    if len(unique_together) and isinstance(unique_together[0], basestring):
+        unique_together = (unique_together, )
+    return tuple([tuple(check) for check in unique_together])
+
+def get_base_model(model):
+    base = model
+    while isinstance(base._meta.pk, models.OneToOneField):
+        base = base._meta.pk.rel.to
+    return base
+
+def get_field_by_attname(model, attname):
+    for field in model._meta.fields:
+        if attname == field.attname:
+            return field
+    return None
+
+class VersioningOptions(object):
+    def __init__(self, model, trashable=False, temporal=False, hashed=False, tracked=False, sequenced=False):
+        versioning = getattr(model, 'Versioning', None)
+
+        self.model = model
+        self.trashable = trashable
+        # temporal models keep track of when each revision was valid, 
+        # see ``revisions.models.TemporalModel``
+        self.temporal = temporal
+        # hashed models store a hash of the content of each revision, 
+        # see ``revisions.models.ContentHashModel``
+        self.hashed = hashed
+        # tracked models record which fields changed in each revision, 
+        # see ``revisions.models.ChangeTrackingModel``
+        self.tracked = tracked
+        # sequenced models number the revisions in a bundle to detect 
+        # concurrent edits, see ``revisions.models.SequencedModel``
+        self.sequenced = sequenced
+        self.base_model = get_base_model(model)
+        self.base_table = self.base_model._meta.db_table
+        self.pk_name = self.base_model._meta.pk.attname
+
+        # how bundle ids are stored, see ``revisions.fields.BundleIdField``
+        self.bundle_id = self.base_model._meta.get_field('cid').id_type
+        if self.bundle_id == 'integer' and not isinstance(self.base_model._meta.pk, 
+                (models.AutoField, models.IntegerField)):
+            raise ImproperlyConfigured("%s can't have integer bundle ids, because "
+                "its primary key isn't an integer." % model.__name__)
+
+        # For UUIDs in particular, we need a way to know the order of revisions
+        # e.g. through a ``changed`` datetime field.
+        self.comparator_name = getattr(versioning, 'comparator', None) or self.pk_name
+        comparator = get_field_by_attname(model, self.comparator_name)
+        if comparator:
+            self.comparator_table = comparator.model._meta.db_table
+        else:
+            self.comparator_table = None
+
+        if temporal:
+            self.interval_fields = ('valid_from', 'valid_to')
+        else:
+            self.interval_fields = ()
+
+        self.clear_each_revision = tuple(getattr(versioning, 'clear_each_revision', ()))
+        # reverse relations to versioned content that gets revised along with 
+        # each revision, see ``revisions.models.VersionedModelBase.revise_followed``
+        self.follow = tuple(getattr(versioning, 'follow', ()))
+        self.publication_date = getattr(versioning, 'publication_date', None)
+
+        # the field that tells us when a revision went live, for point-in-time 
+        # queries: the publication date if there is one, otherwise a date comparator
+        if self.publication_date:
+            self.date_name = self.publication_date
+        elif temporal:
+            self.date_name = 'valid_from'
+        elif isinstance(comparator, models.DateField):
+            self.date_name = self.comparator_name
+        else:
+            self.date_name = None
+
+        # uniqueness constraints that apply to content bundles rather than to rows
+        self.bundle_unique_checks = \
+            tuple([(field, ) for field in getattr(versioning, 'unique', ())]) + \
+            parse_shortcut(getattr(versioning, 'unique_together', ()))
+        self.unique_checks, self.date_checks = self._get_unique_checks(model)
+
+        # fields that belong to a revision rather than to its content, which 
+        # ``clone`` doesn't copy: the new revision gets its own primary key, 
+        # comparator, validity interval and creation date
+        self.clone_skip_fields = frozenset([field.name for field in model._meta.fields if
+            field.primary_key or
+            field.name == self.comparator_name or
+            field.name in self.interval_fields or
+            isinstance(field, CreationDateTimeField) or
+            getattr(field, 'auto_now_add', False)])
+
+        # the fields we keep track of when they change, that is, 
+        # everything but bookkeeping fields
+        self.tracked_fields = tuple([field for field in model._meta.fields if not (
+            field.primary_key or
+            field.name in REVISION_FIELDS or
+            field.name == self.comparator_name or
+            field.name in self.interval_fields or
+            isinstance(field, CreationDateTimeField) or
+            getattr(field, 'auto_now', False) or
+            getattr(field, 'auto_now_add', False))])
+
+        # tracked models store the fields that changed as a bitmask
+        # on a 64-bit integer, one bit per tracked field
+        if self.tracked and len(self.tracked_fields) > 63:
+            raise ImproperlyConfigured("%s has more fields than ChangeTrackingModel can "
+                "keep track of (63)." % model.__name__)
+
+        # the fields that make up the content of a revision
+        self.content_fields = tuple([field for field in self.tracked_fields 
+            if field.name not in self.clear_each_revision])
+
+        # history listings leave out everything that isn't in ``Versioning.history_fields``
+        # or, by default, large text and binary fields, until they're accessed
+        bookkeeping = set(REVISION_FIELDS + self.interval_fields + (self.pk_name, self.comparator_name))
+        history_fields = getattr(versioning, 'history_fields', None)
+        if history_fields is not None:
+            self.history_defer = tuple([field.name for field in model._meta.fields if not (
+                field.primary_key or
+                field.name in bookkeeping or
+                field.name in history_fields)])
+        else:
+            self.history_defer = tuple([field.name for field in model._meta.fields if
+                isinstance(field, LARGE_FIELDS) and not field.primary_key and field.name not in bookkeeping])
+
+        self.indexes = self._get_indexes(model)
+
+        self._frozen = True
+
+    def _get_unique_checks(self, model):
+        # Django actually checks uniqueness for a single field in the very same way it
+        # does things for unique_together, something we happily take advantage of.
+        # This mirrors ``models.Model._get_unique_checks``, with our per-bundle
+        # constraints added to the constraints of the model itself.
+        unique_togethers = [(model, self.bundle_unique_checks + parse_shortcut(model._meta.unique_together))]
+        fields_with_class = [(model, model._meta.local_fields)]
+        for parent_class in model._meta.parents.keys():
+            if parent_class._meta.unique_together:
+                unique_togethers.append((parent_class, parse_shortcut(parent_class._meta.unique_together)))
+            fields_with_class.append((parent_class, parent_class._meta.local_fields))
+
+        unique_checks = []
+        for model_class, unique_together in unique_togethers:
+            for check in unique_together:
+                if (model_class, check) not in unique_checks:
+                    unique_checks.append((model_class, check))
+
+        date_checks = []
+        for model_class, fields in fields_with_class:
+            for f in fields:
+                if f.unique:
+                    unique_checks.append((model_class, (f.name, )))
+                for lookup_type in ('date', 'year', 'month'):
+                    date_field = getattr(f, 'unique_for_' + lookup_type)
+                    if date_field:
+                        date_checks.append((model_class, lookup_type, f.name, date_field))
+
+        return tuple(unique_checks), tuple(date_checks)
+
+    def _get_indexes(self, model):
+        # a model only creates indexes on its own table, so that with concrete 
+        # inheritance parent tables don't get indexed twice
+        indexes = []
+        def add_index(field_names, unique=False, condition=()):
+            fields = [model._meta.get_field(name) for name in field_names + tuple(dict(condition))]
+            if not [field for field in fields if field.model is not model]:
+                indexes.append(Index(model._meta.db_table, 
+                    tuple([model._meta.get_field(name).column for name in field_names]), unique, 
+                    tuple([(model._meta.get_field(name).column, value) for name, value in condition])))
+
+        # every lookup of a bundle's revisions, and of the latest revision 
+        # of each bundle, filters or groups on the bundle id and sorts on or
+        # aggregates over the comparator; with the primary key tacked on 
+        # the index covers these queries entirely
+        if getattr(settings, 'REVISIONS_COVERING_INDEXES', False) and self.comparator_name != self.pk_name:
+            add_index(('cid', self.comparator_name, self.base_model._meta.pk.name))
+        else:
+            add_index(('cid', self.comparator_name))
+
+        # feeds of changes (``LatestManager.changed_since``) scan the comparator
+        if self.comparator_name != self.pk_name:
+            add_index((self.comparator_name, 'cid'))
+
+        # only a small part of all content is ever in the trash, 
+        # so finding the latest revisions in there is cheap
+        if self.trashable:
+            add_index(('cid', self.comparator_name), condition=(('_is_trash', True), ))
+            add_index(('trashed_at', 'cid'), condition=(('_is_trash', True), ))
+
+        if self.sequenced:
+            add_index(('cid', 'vseq'), unique=True)
+
+        if self.temporal:
+            # the latest revision in a bundle is the one that is still valid, 
+            # and a point in time falls within a validity interval
+            add_index(('valid_to', 'cid'))
+            add_index(('valid_from', 'valid_to'))
+
+        return tuple(indexes)
+
+    def get_unique_checks(self, exclude=None):
+        """ The precomputed equivalent of ``models.Model._get_unique_checks``. """
+        exclude = exclude or []
+        unique_checks = [(model_class, check) for model_class, check in self.unique_checks
+            if not [name for name in check if name in exclude]]
+        date_checks = [check for check in self.date_checks
+            if check[2] not in exclude and check[3] not in exclude]
+        return unique_checks, date_checks
+
+    def get_changed_mask(self, names):
+        """ The bitmask that ``ChangeTrackingModel.vchanged`` stores 
+        for these field names. """
+        return sum([1 << i for i, field in enumerate(self.tracked_fields) if field.name in names])
+
+    def get_changed_names(self, mask):
+        """ The names of the fields in a ``ChangeTrackingModel.vchanged`` bitmask. """
+        return [field.name for i, field in enumerate(self.tracked_fields) if mask & (1 << i)]
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError("Versioning options are read-only.")
+        super(VersioningOptions, self).__setattr__(name, value)
+
+    def __repr__(self):
+        return '<VersioningOptions: %s.%s>' % (self.model._meta.app_label, self.model._meta.object_name)
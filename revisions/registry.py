@@ -0,0 +1,60 @@
+# encoding: utf-8
+
+"""
+A registry of every concrete versioned model in the project.
+
+Models register themselves when Django prepares their class (see the
+``class_prepared`` handler at the bottom of ``revisions.models``), so code
+that works across all versioned models -- the trashcan, retention jobs,
+integrity checks -- can simply iterate over the registry instead of
+scanning the ``ContentType`` table and importing model classes at runtime.
+"""
+
+from django.db.models import loading
+from django.utils.datastructures import SortedDict
+
+class VersionedModelRegistry(object):
+    def __init__(self):
+        self._models = SortedDict()
+        self._populated = False
+
+    def register(self, model):
+        """ Registers a model by its versioning options (``model._versioning``),
+        which tell us its base model, comparator, base table and so on. """
+        self._models[model] = model._versioning
+
+    def unregister(self, model):
+        self._models.pop(model, None)
+
+    def _populate(self):
+        # Models only register themselves once their module gets imported.
+        # Asking Django for its models makes sure every installed app has
+        # been loaded, so that the registry is complete. This happens only once.
+        if not self._populated:
+            loading.get_models()
+            self._populated = True
+
+    def get(self, model):
+        self._populate()
+        return self._models[model]
+
+    def get_models(self, parent=None, trashable=None):
+        """ Returns all registered models, optionally limited to subclasses
+        of ``parent`` and/or to models that do or don't support a trash bin. """
+        self._populate()
+        return [info.model for info in self._models.values() if
+            (parent is None or issubclass(info.model, parent)) and
+            (trashable is None or info.trashable == trashable)]
+
+    def __iter__(self):
+        self._populate()
+        return iter(self._models.values())
+
+    def __contains__(self, model):
+        return model in self._models
+
+    def __len__(self):
+        self._populate()
+        return len(self._models)
+
+registry = VersionedModelRegistry()
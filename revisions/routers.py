@@ -0,0 +1,50 @@
+# encoding: utf-8
+
+"""
+Database routing for versioned models.
+
+Django's database routers only know about reads and writes, but versioned
+models get read in two very different ways: reads of the latest revisions
+(``LatestManager.current``, ``get_latest_revision``) are what most of your
+site does all day long, and could just as well be served by a read replica,
+whereas reads of older revisions (``get_revisions``, ``<field>_history``, 
+``fetch``, point-in-time queries and the admin history and diff views) 
+could be served by a separate history or archive database.
+
+Point ``REVISIONS_LATEST_DB`` and ``REVISIONS_HISTORY_DB`` in your settings 
+to the database aliases you'd like to use, or add ``db_for_latest(model, **hints)``
+and ``db_for_history(model, **hints)`` methods to any of the routers in 
+``DATABASE_ROUTERS`` for finer control. Either way, these fall back to
+``db_for_read``.
+
+Writes always go to ``db_for_write``, even for revisions that were 
+read from a replica or from the history database.
+"""
+
+from django.conf import settings
+from django.db import router
+
+def _route(method, setting, model, **hints):
+    for candidate in router.routers:
+        chosen = getattr(candidate, method, None)
+        if chosen:
+            db = chosen(model, **hints)
+            if db:
+                return db
+    return getattr(settings, setting, None) or router.db_for_read(model, **hints)
+
+def db_for_latest(model, **hints):
+    """ The database to read the latest revisions of ``model`` from. """
+    return _route('db_for_latest', 'REVISIONS_LATEST_DB', model, **hints)
+
+def db_for_history(model, **hints):
+    """ The database to read older revisions of ``model`` from. """
+    return _route('db_for_history', 'REVISIONS_HISTORY_DB', model, **hints)
+
+def db_for_write(model, instance=None):
+    """ The database to write to. Instances that were read from a replica or 
+    from the history database get written to the primary database instead. """
+    if instance is None or instance._state.db in (db_for_latest(model), db_for_history(model)):
+        return router.db_for_write(model)
+    else:
+        return router.db_for_write(model, instance=instance)
@@ -0,0 +1,109 @@
+# encoding: utf-8
+
+"""
+Signals that fire once per operation on revisions and bundles, for
+things like cache invalidation and search indexing.
+
+``post_save`` fires for every row that gets saved along the way,
+whereas these signals fire once per logical operation:
+
+* ``revision_created``, when a new revision has been saved, including its
+  many-to-many relations, with the bundle id (``cid``), the primary key of
+  the revision it was made from (``old_pk``, ``None`` for a new bundle) and
+  of the new revision (``new_pk``)
+* ``revision_changed``, when a revision has been changed in place (see
+  ``VersionedModelBase.save_in_place``), with the bundle id, the primary
+  key of the revision and the names of the ``fields`` that changed
+* ``bundle_trashed``, ``bundle_restored`` and ``bundle_deleted`` (both
+  for permanent deletes and for deletes on models without a trash bin),
+  with the keys (``cids``) of all bundles involved, which for trashable
+  models that aren't versioned are primary keys
+
+Inside of ``batched``, nothing gets sent until the transaction commits,
+and then only once per bundle or per model::
+
+    with batched():
+        story.revise()
+        story.revise()
+        Story.trash_bundles(cids)
+
+sends a single ``revision_created`` with the ``old_pk`` of the first and
+the ``new_pk`` of the last revision, and a single ``bundle_trashed``.
+Nothing gets sent when the transaction is rolled back. Pass along a model 
+(``batched(model=Story)``) or a database (``batched(using='default')``)
+to say which database the transaction is for.
+"""
+
+import threading
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils.datastructures import SortedDict
+from revisions.routers import db_for_write
+
+revision_created = Signal(providing_args=['instance', 'cid', 'old_pk', 'new_pk', 'using'])
+revision_changed = Signal(providing_args=['instance', 'cid', 'pk', 'fields', 'using'])
+bundle_trashed = Signal(providing_args=['cids', 'trashed_at', 'using'])
+bundle_restored = Signal(providing_args=['cids', 'using'])
+bundle_deleted = Signal(providing_args=['cids', 'using'])
+
+_state = threading.local()
+
+def send(signal, sender, **kwargs):
+    """ Sends ``signal`` right away, or when the current batch commits. """
+    # history listings defer large fields, but receivers listen to the model
+    if sender._deferred:
+        sender = sender._meta.proxy_for_model
+    batch = getattr(_state, 'batch', None)
+    if batch is None:
+        signal.send(sender=sender, **kwargs)
+    else:
+        batch.add(signal, sender, kwargs)
+
+class batched(object):
+    """ Runs a block in a transaction (see ``transaction.commit_on_success``)
+    and holds back the signals in this module until it commits, coalescing
+    them along the way. Batches inside of a batch join the outer batch and 
+    its transaction, so nothing gets committed or sent until the outer 
+    batch is done. """
+
+    def __init__(self, using=None, model=None):
+        self.using = using or db_for_write(model)
+        self.events = SortedDict()
+
+    def add(self, signal, sender, kwargs):
+        if signal is revision_created:
+            key = (signal, sender, kwargs['using'], kwargs['cid'])
+            if key in self.events:
+                kwargs = dict(kwargs, old_pk=self.events[key]['old_pk'])
+        elif signal is revision_changed:
+            key = (signal, sender, kwargs['using'], kwargs['pk'])
+            if key in self.events:
+                fields = self.events[key]['fields']
+                kwargs = dict(kwargs, fields=fields + [name for name in kwargs['fields'] if name not in fields])
+        else:
+            key = (signal, sender, kwargs['using'])
+            if key in self.events:
+                kwargs = dict(kwargs, cids=self.events[key]['cids'] + list(kwargs['cids']))
+        self.events[key] = kwargs
+
+    def __enter__(self):
+        self.outer = getattr(_state, 'batch', None)
+        if self.outer is not None:
+            return self.outer
+
+        _state.batch = self
+        self.transaction = transaction.commit_on_success(using=self.using)
+        self.transaction.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.outer is not None:
+            return
+
+        try:
+            self.transaction.__exit__(exc_type, exc_value, traceback)
+        finally:
+            _state.batch = None
+        if exc_type is None:
+            for key, kwargs in self.events.items():
+                key[0].send(sender=key[1], **kwargs)
@@ -1,9 +1,8 @@
 from django.db import models
-from revisions.models import VersionedModelBase, VersionedModel, TrashableModel
+from revisions.models import VersionedModelBase, VersionedModel, TrashableModel, TemporalModel, ContentHashModel, ChangeTrackingModel, SequencedModel
 from revisions import shortcuts
 from django.template.defaultfilters import slugify
-from revisions import managers
-from django_extensions.db.fields import UUIDField
+from django_extensions.db.fields import UUIDField, CreationDateTimeField
 
 class Story(VersionedModel):
     title = models.CharField(max_length=250)
@@ -68,6 +67,78 @@ class UUIDStory(VersionedModelBase):
         publication_date = None
         comparator = 'changed'
 
+class PublishedStory(VersionedModel):
+    title = models.CharField(max_length=250)
+    body = models.TextField(blank=True)
+    pub_date = models.DateTimeField()
+
+    def __unicode__(self):
+        return self.title
+
+    class Meta:
+        verbose_name_plural = 'published stories'
+
+    class Versioning:
+        publication_date = 'pub_date'
+        history_fields = ('title', 'pub_date')
+
+class TemporalStory(VersionedModel, TemporalModel):
+    title = models.CharField(max_length=250)
+    body = models.TextField(blank=True)
+
+    def __unicode__(self):
+        return self.title
+
+    class Meta:
+        verbose_name_plural = 'temporal stories'
+
+class HashedStory(VersionedModel, ContentHashModel):
+    title = models.CharField(max_length=250)
+    body = models.TextField(blank=True)
+    log_message = models.CharField(max_length=250, blank=True)
+
+    def __unicode__(self):
+        return self.title
+
+    class Meta:
+        verbose_name_plural = 'hashed stories'
+
+    class Versioning:
+        clear_each_revision = ['log_message']
+
+class TrackedStory(VersionedModel, ChangeTrackingModel):
+    title = models.CharField(max_length=250)
+    body = models.TextField(blank=True)
+
+    def __unicode__(self):
+        return self.title
+
+    class Meta:
+        verbose_name_plural = 'tracked stories'
+
+class SequencedStory(VersionedModel, SequencedModel):
+    title = models.CharField(max_length=250)
+    body = models.TextField(blank=True)
+
+    def __unicode__(self):
+        return self.title
+
+    class Meta:
+        verbose_name_plural = 'sequenced stories'
+
+class CompactStory(VersionedModel):
+    title = models.CharField(max_length=250)
+    body = models.TextField(blank=True)
+
+    def __unicode__(self):
+        return self.title
+
+    class Meta:
+        verbose_name_plural = 'compact stories'
+
+    class Versioning:
+        bundle_id = 'integer'
+
 class UniqueStory(VersionedModel):
     class Meta:
         verbose_name_plural = 'unique stories'
@@ -98,7 +169,6 @@ class ConvenientStory(Story, shortcuts.VersionedModelShortcuts):
     class Meta:
         proxy = True
 
-@managers.trash_aware
 class TrashableStory(VersionedModel, TrashableModel):
     title = models.CharField(max_length=250)
     slug = models.SlugField(max_length=250, editable=False)
@@ -116,13 +186,22 @@ class TrashableStory(VersionedModel, TrashableModel):
 
 # this model allows us to test whether the trash system works nicely in tandem
 # with revisions together with concrete inheritance
-@managers.trash_aware
 class FancyTrashableStory(TrashableStory):
     is_very_fancy = models.BooleanField(default=True)
 
     class Meta:
         verbose_name_plural = 'trashable stories'
 
+class DatedStory(VersionedModel):
+    title = models.CharField(max_length=250)
+    created = CreationDateTimeField()
+
+    def __unicode__(self):
+        return self.title
+
+    class Meta:
+        verbose_name_plural = 'dated stories'
+
 class Aside(VersionedModel):
     # serves to test synchronous versioning
     message = models.CharField(max_length=250)
@@ -133,7 +212,33 @@ class Info(models.Model):
     content = models.CharField(max_length=250)
     story = models.ForeignKey(Story)
 
+class TrashableInfo(TrashableModel):
+    # serves to test the trash bin on models that aren't versioned
+    content = models.CharField(max_length=250)
+
 class InfoToBundle(models.Model):
     # serves to test FKs to a bundle
     content = models.CharField(max_length=250)
-    #story = models.ForeignKey(Story, to_field='cid')
\ No newline at end of file
+    #story = models.ForeignKey(Story, to_field='cid')
+
+class Document(VersionedModel):
+    # serves to test following related content
+    title = models.CharField(max_length=250)
+
+    class Versioning:
+        follow = ['section_set']
+
+class Keyword(models.Model):
+    name = models.CharField(max_length=250)
+
+class Section(VersionedModel, SequencedModel):
+    document = models.ForeignKey(Document)
+    body = models.TextField(blank=True)
+    keywords = models.ManyToManyField(Keyword, blank=True)
+
+    class Versioning:
+        follow = ['footnote_set']
+
+class Footnote(VersionedModel):
+    section = models.ForeignKey(Section)
+    body = models.TextField(blank=True)
@@ -1,9 +1,26 @@
+import os
+import time
+import json
+import uuid
+import tempfile
 from copy import copy
-from django.db import IntegrityError
-from django.test import TestCase
-from django.test.client import Client
-from django.contrib.auth.models import User
+from datetime import date, datetime
+from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from django.core.management import call_command
+from django.db import IntegrityError, connection, router
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase, TransactionTestCase
+from django.test.client import Client, RequestFactory
+from django.contrib.auth.models import Permission, User
+from django.http import HttpResponse, Http404, QueryDict
+from django.utils.http import parse_http_date
 import revisions
+from revisions.instrumentation import Collector, query_budget
+from revisions import indexes, managers, routers, signals, views
+from revisions.models import VersionedModel, VersionedModelBase, RevisionConflict
+from revisions.options import VersioningOptions
+from revisions.registry import registry
+from revisions.utils import retry_on_conflict
 from revisions.tests import models
 
 #
@@ -197,6 +214,30 @@ class UniquenessTests(TestCase):
         new_story = models.UniqueStory(title="howdy", body="there")
         self.assertRaises(IntegrityError, new_story.save)
 
+    def test_only_latest_revisions_count(self):
+        # once a bundle moves on, the values of its older revisions are up for grabs
+        self.story.body = "elsewhere"
+        self.story.revise()
+        new_story = models.UniqueStory(title="howdy", body="there")
+        new_story.save()
+
+    def test_single_query(self):
+        new_story = models.UniqueStory(title="howdy", slug="howdy", body="over here")
+        self.assertNumQueries(1, new_story.validate_bundle)
+
+    def test_validate_bundles(self):
+        stories = [
+            models.UniqueStory(title="one", slug="one", body="first"),
+            models.UniqueStory(title="two", slug="two", body="second"),
+            ]
+        self.assertNumQueries(1, models.UniqueStory.validate_bundles, stories)
+        # clashes with an existing bundle
+        stories.append(models.UniqueStory(title="three", slug="three", body="there"))
+        self.assertRaises(IntegrityError, models.UniqueStory.validate_bundles, stories)
+        # clashes within the set
+        stories[-1] = models.UniqueStory(title="three", slug="three", body="first")
+        self.assertRaises(IntegrityError, models.UniqueStory.validate_bundles, stories)
+
 class ForeignKeyTests(TestCase):
     fixtures = ['revisions_scenario', ]
     
@@ -310,6 +351,1179 @@ class InheritanceTrashTests(TrashTests):
         self.story = models.FancyTrashableStory.latest.all()[0]
         self.mgr = models.FancyTrashableStory._default_manager
 
+class TrashManagerTests(TestCase):
+    def setUp(self):
+        self.mgr = models.TrashableStory.latest
+        self.story = models.TrashableStory.objects.create(title="Hello", body="there")
+        models.TrashableStory.objects.create(title="Goodbye", body="there")
+
+    def test_fresh_querysets(self):
+        self.assertFalse(self.mgr.live is self.mgr.live)
+        live = list(self.mgr.live)
+        self.story.delete()
+        self.assertEquals(len(self.mgr.live), len(live) - 1)
+        self.assertEquals([story.cid for story in self.mgr.trash], [self.story.cid])
+
+    def test_latest_only(self):
+        self.story.title = "A new title"
+        self.story.revise()
+        self.assertEquals(self.mgr.live.filter(cid=self.story.cid).get().title, "A new title")
+        self.story.delete()
+        self.assertEquals(self.mgr.trash.get(cid=self.story.cid).title, "A new title")
+
+    def test_not_trashable(self):
+        self.assertRaises(ImproperlyConfigured, lambda: models.Story.latest.trash)
+
+    def test_not_versioned(self):
+        info = models.TrashableInfo.objects.create(content="Hello")
+        models.TrashableInfo.objects.create(content="Goodbye")
+        info.delete()
+        self.assertEquals([obj.content for obj in models.TrashableInfo.objects.live], ["Goodbye"])
+        self.assertEquals([obj.content for obj in models.TrashableInfo.objects.trash], ["Hello"])
+        info.restore()
+        self.assertEquals(len(models.TrashableInfo.objects.live), 2)
+        # versioned models keep their plain manager
+        self.assertFalse(isinstance(models.TrashableStory.objects, managers.TrashManager))
+
+    def test_bundles(self):
+        self.story.revise()
+        self.story.delete()
+        revisions = models.TrashableStory.objects.filter(cid=self.story.cid)
+        self.assertEquals(len(revisions), 2)
+        self.assertTrue(all([story.is_trash and story.trashed_at for story in revisions]))
+        self.story.restore()
+        self.assertEquals(self.mgr.live.filter(cid=self.story.cid).count(), 1)
+        self.assertFalse(models.TrashableStory.objects.filter(cid=self.story.cid, trashed_at__isnull=False))
+        models.TrashableStory.delete_bundles_permanently([self.story.cid])
+        self.assertFalse(models.TrashableStory.objects.filter(cid=self.story.cid))
+
+class SignalTests(TestCase):
+    def setUp(self):
+        self.events = []
+        for signal in (signals.revision_created, signals.revision_changed, signals.bundle_trashed, 
+                signals.bundle_restored, signals.bundle_deleted):
+            signal.connect(self.receive, dispatch_uid='signal-tests')
+
+    def tearDown(self):
+        for signal in (signals.revision_created, signals.revision_changed, signals.bundle_trashed, 
+                signals.bundle_restored, signals.bundle_deleted):
+            signal.disconnect(dispatch_uid='signal-tests')
+
+    def receive(self, signal, sender, **kwargs):
+        self.events.append((signal, sender, kwargs))
+
+    def test_revisions(self):
+        story = models.Story.objects.create(title="Hello", body="there")
+        first = story.pk
+        story.body = "world"
+        second = story.revise()
+        self.assertEquals([(signal, kwargs['cid'], kwargs['old_pk'], kwargs['new_pk']) 
+            for signal, sender, kwargs in self.events], [
+            (signals.revision_created, story.cid, None, first),
+            (signals.revision_created, story.cid, first, second.pk),
+            ])
+        story.delete()
+        self.assertEquals(self.events[-1][0], signals.bundle_deleted)
+        self.assertEquals(self.events[-1][2]['cids'], [story.cid])
+
+    def test_deferred(self):
+        story = models.PublishedStory.objects.create(title="Hello", body="there", pub_date=datetime(2010, 1, 1))
+        revision = story.get_revisions()[0]
+        self.assertTrue(revision._deferred)
+        del self.events[:]
+        revision.title = "Goodbye"
+        revision.save_in_place()
+        revision.revise()
+        revision.delete()
+        self.assertEquals([(signal, sender) for signal, sender, kwargs in self.events], [
+            (signals.revision_changed, models.PublishedStory),
+            (signals.revision_created, models.PublishedStory),
+            (signals.bundle_deleted, models.PublishedStory),
+            ])
+
+    def test_in_place(self):
+        story = models.TrackedStory.objects.create(title="Hello", body="there")
+        del self.events[:]
+        with signals.batched(model=models.TrackedStory):
+            story.body = "world"
+            story.save_in_place()
+            story.title = "Goodbye"
+            story.save_in_place()
+        self.assertEquals([(signal, kwargs['pk'], kwargs['fields']) for signal, sender, kwargs in self.events], 
+            [(signals.revision_changed, story.pk, ['body', 'title'])])
+
+    def test_bundles(self):
+        story = models.TrashableStory.objects.create(title="Hello", body="there")
+        del self.events[:]
+        story.delete()
+        story.restore()
+        story.delete_permanently()
+        self.assertEquals([(signal, sender, kwargs['cids']) for signal, sender, kwargs in self.events], [
+            (signals.bundle_trashed, models.TrashableStory, [story.cid]),
+            (signals.bundle_restored, models.TrashableStory, [story.cid]),
+            (signals.bundle_deleted, models.TrashableStory, [story.cid]),
+            ])
+
+    def test_batched(self):
+        with signals.batched():
+            story = models.TrashableStory.objects.create(title="Hello", body="there")
+            story.revise()
+            last = story.revise()
+            other = models.TrashableStory.objects.create(title="Goodbye", body="there")
+            story.delete()
+            other.delete()
+            self.assertEquals(self.events, [])
+        self.assertEquals([(signal, kwargs.get('old_pk'), kwargs.get('new_pk'), kwargs.get('cids')) 
+            for signal, sender, kwargs in self.events], [
+            (signals.revision_created, None, last.pk, None),
+            (signals.revision_created, None, other.pk, None),
+            (signals.bundle_trashed, None, None, [story.cid, other.cid]),
+            ])
+
+    def test_rollback(self):
+        try:
+            with signals.batched():
+                models.Story.objects.create(title="Hello", body="there")
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEquals(self.events, [])
+
+class NestedBatchTests(TransactionTestCase):
+    def setUp(self):
+        self.events = []
+        signals.revision_created.connect(self.receive, dispatch_uid='nested-batch-tests')
+
+    def tearDown(self):
+        signals.revision_created.disconnect(dispatch_uid='nested-batch-tests')
+
+    def receive(self, signal, sender, **kwargs):
+        self.events.append(kwargs['new_pk'])
+
+    def test_rollback(self):
+        try:
+            with signals.batched(model=models.Document):
+                with signals.batched(model=models.Document):
+                    document = models.Document.objects.create(title="Hello")
+                    models.Section.objects.create(document=document, body="there")
+                # following related content doesn't commit the batch either
+                document.revise()
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEquals(models.Document.objects.count(), 0)
+        self.assertEquals(models.Section.objects.count(), 0)
+        self.assertEquals(self.events, [])
+
+    def test_commit(self):
+        with signals.batched(model=models.Document):
+            with signals.batched(model=models.Document):
+                document = models.Document.objects.create(title="Hello")
+            self.assertEquals(self.events, [])
+        self.assertEquals(self.events, [document.pk])
+
+class FollowTests(TestCase):
+    def setUp(self):
+        self.document = models.Document.objects.create(title="Hello")
+        self.keyword = models.Keyword.objects.create(name="greetings")
+        self.sections = [models.Section.objects.create(document=self.document, body=body) 
+            for body in ("there", "world")]
+        self.sections[0].keywords.add(self.keyword)
+        self.footnote = models.Footnote.objects.create(section=self.sections[0], body="Or not.")
+
+    def test_follow(self):
+        revision = self.document.revise()
+        sections = list(models.Section.latest.filter(document=revision).order_by('body'))
+        self.assertEquals([section.body for section in sections], ["there", "world"])
+        self.assertEquals([section.cid for section in sections], [section.cid for section in self.sections])
+        self.assertEquals([section.vseq for section in sections], [2, 2])
+        self.assertEquals(list(sections[0].keywords.all()), [self.keyword])
+        self.assertEquals(list(sections[1].keywords.all()), [])
+        footnote = models.Footnote.latest.get(cid=self.footnote.cid)
+        self.assertEquals(footnote.section, sections[0])
+        # the previous revisions stay put
+        self.assertEquals(models.Section.objects.filter(document=self.document).count(), 2)
+
+    def test_latest_only(self):
+        self.sections[1].body = "everyone"
+        self.sections[1].revise()
+        self.document.revise()
+        self.assertEquals(sorted([section.body for section in models.Section.latest.current]), 
+            ["everyone", "there"])
+        self.assertEquals(models.Section.objects.count(), 5)
+
+    def test_query_budget(self):
+        # the document, then selecting, inserting and refetching sections 
+        # and footnotes, and copying the keywords of the sections
+        for i in range(3):
+            models.Section.objects.create(document=self.document, body="more")
+        with query_budget(self, 'revise', 9):
+            self.document.revise()
+
+    def test_relations(self):
+        self.assertEquals(models.Document.get_followed_relations(), 
+            [(models.Section, models.Section._meta.get_field('document'))])
+        self.assertEquals(models.Footnote.get_followed_relations(), [])
+
+class ChunkedIterationTests(TestCase):
+    def setUp(self):
+        self.stories = [models.Story.objects.create(title="Story %i" % i, body="there") for i in range(5)]
+        for story in self.stories[:3]:
+            story.body = "everywhere"
+            story.revise()
+
+    def test_chunks(self):
+        latest = [story.pk for story in models.Story.latest.current]
+        for size in (1, 2, 5, 10):
+            chunked = [story.pk for story in models.Story.latest.iter_chunks(size=size)]
+            self.assertEquals(sorted(chunked), sorted(latest))
+            self.assertEquals(len(chunked), len(set(chunked)))
+
+    def test_bundle_order(self):
+        cids = [story.cid for story in models.Story.latest.iter_chunks(size=2)]
+        self.assertEquals(cids, sorted(cids))
+
+    def test_inheritance(self):
+        models.FancyStory.objects.create(title="Hello", body="there")
+        self.assertEquals(len(list(models.FancyStory.latest.iter_chunks(size=1))), 
+            len(models.FancyStory.latest.all()))
+
+class ChangeFeedTests(TestCase):
+    def test_changes(self):
+        first = models.Story.objects.create(title="Hello", body="there")
+        second = models.Story.objects.create(title="Goodbye", body="there")
+        changes, deleted, watermark = models.Story.latest.changed_since()
+        self.assertEquals([story.pk for story in changes], [first.pk, second.pk])
+        self.assertEquals(models.Story.latest.changed_since(watermark), ([], [], watermark))
+
+        first.body = "everywhere"
+        revision = first.revise()
+        changes, deleted, watermark = models.Story.latest.changed_since(watermark)
+        self.assertEquals([story.pk for story in changes], [revision.pk])
+        self.assertEquals(watermark.comparator, revision.pk)
+
+    def test_trashings(self):
+        story = models.TrashableStory.objects.create(title="Hello", body="there")
+        other = models.TrashableStory.objects.create(title="Goodbye", body="there")
+        changes, deleted, watermark = models.TrashableStory.latest.changed_since()
+        self.assertEquals(watermark.trashed_at, None)
+
+        story.delete()
+        changes, deleted, watermark = models.TrashableStory.latest.changed_since(watermark)
+        self.assertEquals([(obj.pk, obj.is_trash) for obj in changes], [(story.pk, True)])
+        self.assertEquals(watermark.trashed_at, story.trashed_at)
+        self.assertEquals(models.TrashableStory.latest.changed_since(watermark)[0], [])
+
+    def test_deletions(self):
+        story = models.Story.objects.create(title="Hello", body="there")
+        trashable = models.TrashableStory.objects.create(title="Hello", body="there")
+        models.Story.objects.create(title="Goodbye", body="there").delete()
+        changes, deleted, watermark = models.Story.latest.changed_since()
+        self.assertEquals(deleted, [])
+
+        story.delete()
+        changes, deleted, watermark = models.Story.latest.changed_since(watermark)
+        self.assertEquals((changes, deleted), ([], [story.cid]))
+        self.assertEquals(models.Story.latest.changed_since(watermark)[1], [])
+
+        changes, deleted, watermark = models.TrashableStory.latest.changed_since()
+        trashable.delete_permanently()
+        changes, deleted, watermark = models.TrashableStory.latest.changed_since(watermark)
+        self.assertEquals((changes, deleted), ([], [trashable.cid]))
+
+    def test_limit(self):
+        stories = [models.TrashableStory.objects.create(title="Story %i" % i, body="there") for i in range(3)]
+        def read(watermark):
+            pages = []
+            while True:
+                changes, deleted, watermark = models.TrashableStory.latest.changed_since(watermark, limit=2)
+                if not changes:
+                    return pages, watermark
+                pages.append([obj.cid for obj in changes])
+
+        pages, watermark = read(None)
+        self.assertEquals([len(page) for page in pages], [2, 1])
+        self.assertEquals(sum(pages, []), [story.cid for story in stories])
+        # bundles that got trashed at the same time don't get lost between pages
+        models.TrashableStory.trash_bundles([story.cid for story in stories])
+        pages, watermark = read(watermark)
+        self.assertEquals([len(page) for page in pages], [2, 1])
+        self.assertEquals(sorted(sum(pages, [])), sorted([story.cid for story in stories]))
+
+    def test_equal_comparators(self):
+        for title in ("Hello", "Goodbye"):
+            models.UUIDStory(title=title, body="there").save()
+        first, second = models.UUIDStory.objects.order_by('pk')
+        models.UUIDStory.objects.filter(pk=first.pk).update(changed=datetime(2010, 1, 2))
+        models.UUIDStory.objects.filter(pk=second.pk).update(changed=datetime(2010, 1, 1))
+        changes, deleted, watermark = models.UUIDStory.latest.changed_since()
+        self.assertEquals([story.pk for story in changes], [second.pk, first.pk])
+        self.assertEquals(watermark.pk, first.pk)
+
+        # a change that's just as recent as the last one we've seen
+        models.UUIDStory.objects.filter(pk=second.pk).update(changed=datetime(2010, 1, 2))
+        changes, deleted, watermark = models.UUIDStory.latest.changed_since(watermark)
+        self.assertEquals([story.pk for story in changes], [second.pk])
+        self.assertEquals(models.UUIDStory.latest.changed_since(watermark)[0], [])
+
+    def test_comparator_index(self):
+        table = models.UUIDStory._meta.db_table
+        self.assertTrue(indexes.Index(table, ('changed', 'cid'), False) in models.UUIDStory._versioning.indexes)
+
+class TrashcanTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.factory = RequestFactory()
+        self.stories = []
+        for i in range(3):
+            story = models.TrashableStory.objects.create(title="Story %i" % i, body="there")
+            story.revise()
+            story.delete()
+            self.stories.append(story)
+        self.fancy = models.FancyTrashableStory.objects.create(title="Fancy", body="there")
+        self.fancy.delete()
+
+    def get(self, **params):
+        request = self.factory.get('/trash/', params)
+        request.user = self.user
+        return views.trashcan(request, page_size=2)
+
+    def test_pages(self):
+        seen = []
+        response = self.get()
+        while True:
+            seen.extend([item['object'] for item in response.context_data['trash_list']])
+            if not response.context_data['next_page']:
+                break
+            response = self.get(after=response.context_data['next_page'])
+        self.assertEquals(len(seen), 4)
+        self.assertEquals(len(set([(obj.__class__, obj.cid) for obj in seen])), 4)
+        self.assertEquals([obj.trashed_at for obj in seen], sorted([obj.trashed_at for obj in seen], reverse=True))
+
+    def test_actions(self):
+        bundles = ['tests.trashablestory:%s' % story.cid for story in self.stories[:2]]
+        request = self.factory.post('/trash/', {'action': 'restore', 'bundles': bundles})
+        request.user = self.user
+        self.assertEquals(views.trashcan(request).status_code, 302)
+        self.assertEquals(models.TrashableStory.latest.live.filter(
+            cid__in=[story.cid for story in self.stories]).count(), 2)
+
+        request = self.factory.post('/trash/', {'action': 'delete', 'bundles': bundles[:1]})
+        request.user = self.user
+        views.trashcan(request)
+        self.assertFalse(models.TrashableStory.objects.filter(cid=self.stories[0].cid))
+
+    def test_permissions(self):
+        editor = User.objects.create_user('editor', 'editor@example.com', 'secret')
+        editor.is_staff = True
+        editor.save()
+        editor.user_permissions.add(Permission.objects.get(
+            content_type__app_label='tests', codename='change_trashablestory'))
+        bundles = ['tests.trashablestory:%s' % self.stories[0].cid]
+        # permissions get cached on the user
+        request = self.factory.post('/trash/', {'action': 'restore', 'bundles': bundles})
+        request.user = User.objects.get(pk=editor.pk)
+        self.assertEquals(views.trashcan(request).status_code, 302)
+        request = self.factory.post('/trash/', {'action': 'delete', 'bundles': bundles})
+        request.user = User.objects.get(pk=editor.pk)
+        self.assertRaises(PermissionDenied, views.trashcan, request)
+        self.assertTrue(models.TrashableStory.objects.filter(cid=self.stories[0].cid))
+
+class DifferTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.story = models.HashedStory.objects.create(title="Hello", body="there")
+        self.first = self.story.pk
+        # a revision with the very same content
+        self.story.clone()
+
+    def get(self, baseline, compare_with, user=None, **headers):
+        request = self.factory.get('/diff/', {'format': 'json'}, **headers)
+        request.user = user or self.user
+        return views.differ(request, str(baseline), str(compare_with), model='tests.HashedStory')
+
+    def test_json(self):
+        response = self.get(self.first, self.story.pk)
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response['ETag'])
+        self.assertTrue('private' in response['Cache-Control'])
+        data = json.loads(response.content)
+        self.assertEquals(data['from'], self.first)
+        self.assertEquals(data['to'], self.story.pk)
+        fields = dict([(field['field'], field) for field in data['fields']])
+        self.assertEquals(fields['title']['to'], "Hello")
+        self.assertFalse([field for field in data['fields'] if field['changed']])
+
+    def test_not_modified(self):
+        etag = self.get(self.first, self.story.pk)['ETag']
+        with self.assertNumQueries(1):
+            response = self.get(self.first, self.story.pk, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 304)
+        self.assertNotEquals(self.get(self.story.pk, self.first)['ETag'], etag)
+
+    def test_changed_in_place(self):
+        request = self.factory.get('/diff/', {'format': 'json'})
+        get_etag = lambda: views.get_diff_etag(request, str(self.first), str(self.story.pk), model='tests.HashedStory')
+        etag = get_etag()
+        self.story.body = "Fixed a typo."
+        self.story.save_in_place()
+        self.assertNotEquals(get_etag(), etag)
+
+    def test_other_bundle(self):
+        other = models.HashedStory.objects.create(title="Goodbye", body="there")
+        self.assertRaises(Http404, self.get, self.first, other.pk)
+
+    def test_unknown(self):
+        self.assertRaises(Http404, self.get, self.first, self.story.pk + 100)
+        self.assertRaises(Http404, self.get, self.first, 'nonsense')
+
+    def test_permissions(self):
+        staff = User.objects.create_user('staff', 'staff@example.com', 'secret')
+        staff.is_staff = True
+        staff.save()
+        self.assertRaises(PermissionDenied, self.get, self.first, self.story.pk, user=staff)
+
+class PointInTimeTests(TestCase):
+    def setUp(self):
+        self.model = models.PublishedStory
+        self.first_draft = self.model(title='First story', body='Draft.', pub_date=datetime(2010, 1, 1))
+        self.first_draft.save()
+        self.second = self.model(title='Second story', body='Draft.', pub_date=datetime(2010, 1, 2))
+        self.second.save()
+        self.first_final = self.model.objects.get(pk=self.first_draft.pk)
+        self.first_final.body = 'Final.'
+        self.first_final.pub_date = datetime(2010, 1, 3)
+        self.first_final.revise()
+
+    def test_as_of(self):
+        snapshot = self.model.latest.as_of(datetime(2010, 1, 2))
+        self.assertEquals(set([story.pk for story in snapshot]), set([self.first_draft.pk, self.second.pk]))
+        self.assertEquals(set([story.body for story in snapshot]), set(['Draft.']))
+        self.assertNumQueries(1, lambda: list(self.model.latest.as_of(datetime(2010, 1, 2))))
+        snapshot = self.model.latest.as_of(datetime(2010, 1, 3))
+        self.assertEquals(set([story.pk for story in snapshot]), set([self.first_final.pk, self.second.pk]))
+
+    def test_as_of_before_any_content(self):
+        self.assertEquals(len(self.model.latest.as_of(datetime(2009, 1, 1))), 0)
+
+    def test_as_of_requires_a_date(self):
+        self.assertRaises(ImproperlyConfigured, models.Story.latest.as_of, datetime(2010, 1, 1))
+
+    def test_as_of_with_date_comparator(self):
+        for title in ('First story', 'Second story'):
+            story = models.UUIDStory(title=title, body='Draft.')
+            story.save()
+        story = models.UUIDStory.objects.get(title='First story')
+        story.body = 'Final.'
+        story.revise()
+        
+        # spread the revisions out in time
+        for day, body in enumerate(['Draft.', 'Final.']):
+            models.UUIDStory.objects.filter(body=body).update(changed=datetime(2010, 1, day + 1))
+        
+        latest = models.UUIDStory.latest.current
+        self.assertEquals(sorted([(story.title, story.body) for story in latest]), 
+            [('First story', 'Final.'), ('Second story', 'Draft.')])
+        snapshot = models.UUIDStory.latest.as_of(date(2010, 1, 1))
+        self.assertEquals(sorted([(story.title, story.body) for story in snapshot]), 
+            [('First story', 'Draft.'), ('Second story', 'Draft.')])
+
+    def test_fetch_by_date(self):
+        story = self.model.fetch(datetime(2010, 1, 2, 12))
+        self.assertEquals(story.pk, self.second.pk)
+        story = self.model.fetch(datetime(2010, 1, 2, 12), bundle=self.first_final.cid)
+        self.assertEquals(story.pk, self.first_draft.pk)
+        self.assertRaises(self.model.DoesNotExist, self.model.fetch, date(2009, 1, 1))
+
+    def test_revert_to_date(self):
+        reverted = self.first_final.revert_to(datetime(2010, 1, 2))
+        self.assertEquals(reverted.body, 'Draft.')
+        self.assertEquals(reverted.cid, self.first_final.cid)
+
+class TemporalTests(TestCase):
+    def setUp(self):
+        self.model = models.TemporalStory
+        self.story = self.model(title='A story', body='First revision.')
+        self.story.save()
+        self.other = self.model(title='Another story', body='First revision.')
+        self.other.save()
+
+    def test_open_interval(self):
+        self.assertTrue(self.story.valid_from)
+        self.assertEquals(self.story.valid_to, None)
+
+    def test_revise_closes_interval(self):
+        first_pk = self.story.pk
+        self.story.body = 'Second revision.'
+        second = self.story.revise()
+        first = self.model.objects.get(pk=first_pk)
+        self.assertEquals(first.valid_to, second.valid_from)
+        self.assertEquals(second.valid_to, None)
+        # the interval of another bundle is left alone
+        self.assertEquals(self.model.objects.get(pk=self.other.pk).valid_to, None)
+
+    def test_in_place_save(self):
+        self.story.title = 'A small change'
+        self.story.save()
+        self.assertEquals(self.model.objects.filter(cid=self.story.cid).count(), 1)
+        self.assertEquals(self.model.objects.get(pk=self.story.pk).valid_to, None)
+
+    def test_latest(self):
+        self.story.body = 'Second revision.'
+        second = self.story.revise()
+        latest = self.model.latest.current
+        self.assertEquals(set([story.pk for story in latest]), set([second.pk, self.other.pk]))
+        self.assertTrue('IS NULL' in str(latest.query))
+
+    def test_revert_to(self):
+        first_pk = self.story.pk
+        self.story.body = 'Second revision.'
+        second = self.story.revise()
+        reverted = second.revert_to(first_pk)
+        self.assertEquals(self.model.objects.get(pk=second.pk).valid_to, reverted.valid_from)
+        self.assertEquals(self.model.latest.get(cid=self.story.cid).pk, reverted.pk)
+
+    def test_as_of(self):
+        first_pk = self.story.pk
+        revisions = []
+        for i in range(3):
+            self.story.body = 'Revision %i.' % (i + 2)
+            revisions.append(self.story.revise())
+        # give each revision its own day
+        for day, pk in enumerate([first_pk] + [revision.pk for revision in revisions]):
+            self.model.objects.filter(pk=pk).update(valid_from=datetime(2010, 1, day + 1))
+            self.model.objects.filter(pk=pk, valid_to__isnull=False).update(valid_to=datetime(2010, 1, day + 2))
+        
+        snapshot = self.model.latest.as_of(datetime(2010, 1, 2, 12)).filter(cid=self.story.cid)
+        self.assertEquals([story.pk for story in snapshot], [revisions[0].pk])
+        window = self.model.latest.during(datetime(2010, 1, 2, 12), datetime(2010, 1, 3, 12)).order_by('pk')
+        self.assertEquals([story.pk for story in window], [revisions[0].pk, revisions[1].pk])
+
+    def test_indexes(self):
+        sql = '\n'.join(indexes.sql_indexes([self.model]))
+        self.assertTrue('"valid_to", "cid"' in sql)
+        self.assertTrue('"valid_from", "valid_to"' in sql)
+        self.assertEquals(indexes.sql_indexes([models.FancyStory]), [])
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        self.story = models.Story(title='A story', body='First revision.')
+        self.story.save()
+
+    def test_collector(self):
+        with Collector() as collector:
+            self.story.body = 'Second revision.'
+            self.story.revise()
+            list(models.Story.latest.current)
+        summary = collector.summary()
+        for operation in ('revise', 'clone', 'validate_bundle', 'latest'):
+            self.assertTrue(operation in summary)
+        self.assertEquals(summary['latest']['queries'], 1)
+        self.assertEquals(summary['revise']['calls'], 1)
+        self.assertTrue(summary['revise']['queries'] >= 1)
+        self.assertEquals(collector.calls[0][1], models.Story)
+
+    def test_collector_stops(self):
+        collector = Collector().start().stop()
+        self.story.revise()
+        self.assertEquals(collector.summary(), {})
+
+    def test_query_budget(self):
+        with query_budget(self, 'get_revisions', 3):
+            self.story.get_revisions()
+        
+        def exceed_budget():
+            with query_budget(self, 'get_revisions', 0):
+                self.story.get_revisions()
+        self.assertRaises(AssertionError, exceed_budget)
+
+    def test_middleware(self):
+        from django.test.client import RequestFactory
+        from revisions.middleware import RevisionsInstrumentationMiddleware
+        
+        middleware = RevisionsInstrumentationMiddleware()
+        request = RequestFactory().get('/')
+        middleware.process_request(request)
+        self.story.revise()
+        with self.settings(REVISIONS_INSTRUMENTATION_HEADER=True):
+            response = middleware.process_response(request, HttpResponse())
+        self.assertTrue('"revise"' in response['X-Revisions-Stats'])
+
+class ContentHashTests(TestCase):
+    def setUp(self):
+        self.model = models.HashedStory
+        self.story = self.model(title='A story', body='First revision.')
+        self.story.save()
+
+    def test_hash(self):
+        self.assertEquals(len(self.story.vhash), 40)
+        self.assertEquals(self.story.vhash, self.story.compute_content_hash())
+        fields = [field.name for field in self.model._versioning.content_fields]
+        self.assertEquals(fields, ['title', 'body'])
+
+    def test_skip_unchanged(self):
+        # a new log message alone doesn't make for a new revision
+        self.story.log_message = 'Nothing much.'
+        revision = self.story.revise()
+        self.assertEquals(revision.pk, self.story.pk)
+        self.assertEquals(self.model.objects.filter(cid=self.story.cid).count(), 1)
+
+    def test_revise_changed(self):
+        self.story.body = 'Second revision.'
+        revision = self.story.revise()
+        self.assertEquals(self.model.objects.filter(cid=self.story.cid).count(), 2)
+        self.assertNotEquals(revision.vhash, self.model.objects.get(cid=self.story.cid, body='First revision.').vhash)
+
+    def test_revert_to_latest_content(self):
+        first_pk = self.story.pk
+        self.story.body = 'Second revision.'
+        self.story.revise()
+        self.story.body = 'First revision.'
+        third = self.story.revise()
+        # the latest revision already has this content
+        reverted = third.revert_to(first_pk)
+        self.assertEquals(reverted.pk, third.pk)
+
+    def test_same_content(self):
+        self.story.body = 'Second revision.'
+        second = self.story.revise()
+        self.story.body = 'First revision.'
+        third = self.story.revise()
+        first = self.model.objects.get(pk=self.model.objects.filter(cid=self.story.cid).order_by('vid')[0].pk)
+        self.assertTrue(first.has_same_content(third))
+        self.assertFalse(first.has_same_content(second))
+        # also works for models without a hash column
+        story = models.Story(title='A story', body='Some text.')
+        self.assertTrue(story.has_same_content(models.Story(title='Another story', body='Some text.')))
+
+class ChangeTrackingTests(TestCase):
+    def setUp(self):
+        self.model = models.TrackedStory
+        self.story = self.model(title='A story', body='First revision.')
+        self.story.save()
+
+    def test_dirty_fields(self):
+        self.assertEquals(self.story.get_dirty_fields(), [])
+        self.story.body = 'Changed.'
+        self.assertEquals(self.story.get_dirty_fields(), ['body'])
+        story = self.model.objects.get(pk=self.story.pk)
+        self.assertEquals(story.get_dirty_fields(), [])
+        story.title = 'Another title'
+        self.assertEquals(story.get_dirty_fields(), ['title'])
+
+    def test_changed_fields(self):
+        self.assertEquals(self.story.get_changed_fields(), ['title', 'body'])
+        self.story.body = 'Second revision.'
+        second = self.story.revise()
+        self.assertEquals(second.get_changed_fields(), ['body'])
+        self.story.title = 'A new title'
+        third = self.story.revise()
+        self.assertEquals(self.model.objects.get(pk=third.pk).get_changed_fields(), ['title'])
+
+    def test_bitmask(self):
+        self.story.body = 'Second revision.'
+        second = self.story.revise()
+        self.assertEquals(self.model.objects.filter(pk=second.pk).values_list('vchanged', flat=True)[0], 2)
+        self.assertEquals(self.model._versioning.get_changed_mask(['title', 'body']), 3)
+        self.assertEquals(self.model.objects.filter(pk=self.story.get_revisions()[0].pk).values_list('vchanged', flat=True)[0], 3)
+        # a revision that doesn't change a thing
+        third = self.story.revise()
+        self.assertEquals(self.model.objects.filter(pk=third.pk).values_list('vchanged', flat=True)[0], 0)
+        self.assertEquals(len(self.story.title_history), 1)
+        # only tracked models remember what they were loaded with
+        self.assertFalse(hasattr(models.Story(), '_loaded_values'))
+
+    def test_unchanged_fields(self):
+        from revisions.diffs import get_unchanged_fields
+        first = self.model.objects.get(pk=self.story.pk)
+        self.story.body = 'Second revision.'
+        second = self.story.revise()
+        self.story.title = 'A new title'
+        third = self.story.revise()
+        self.assertTrue('body' in get_unchanged_fields(second, third))
+        # further apart, the changes in between count too
+        self.assertEquals(get_unchanged_fields(first, third), [])
+
+    def test_revert_to(self):
+        first_pk = self.story.pk
+        self.story.title = 'A new title'
+        self.story.body = 'Second revision.'
+        self.story.revise()
+        self.story.body = 'Third revision.'
+        self.story.revise()
+        reverted = self.story.revert_to(first_pk)
+        self.assertEquals(reverted.get_changed_fields(), ['title', 'body'])
+
+    def test_field_history(self):
+        for body in ['Second revision.', 'Third revision.']:
+            self.story.body = body
+            self.story.revise()
+        self.story.title = 'A new title'
+        self.story.revise()
+        self.assertEquals([title for title, revision in self.story.title_history], ['A story', 'A new title'])
+        self.assertEquals(len(self.story.body_history), 3)
+
+    def test_deferred_history(self):
+        self.story.body = 'Second revision.'
+        self.story.revise()
+        revisions = self.story.get_revisions()
+        self.assertTrue('body' in revisions.query.deferred_loading[0])
+        self.assertEquals([revision.body for revision in revisions], ['First revision.', 'Second revision.'])
+        self.assertEquals(revisions.prev.body, 'First revision.')
+        self.assertTrue(self.story.check_if_latest_revision())
+        self.assertFalse(revisions.prev.check_if_latest_revision())
+
+    def test_delete_signals(self):
+        self.story.body = 'Second revision.'
+        self.story.revise()
+        deleted = []
+        def receiver(sender, instance, **kwargs):
+            deleted.append(instance.pk)
+        post_delete.connect(receiver, sender=models.TrackedStory, weak=False)
+        try:
+            self.story.delete()
+        finally:
+            post_delete.disconnect(receiver, sender=models.TrackedStory)
+        self.assertEquals(len(deleted), 2)
+
+class SmallChangeTests(TestCase):
+    def setUp(self):
+        self.story = models.Story(title='A story', body='First revision.')
+        self.story.save()
+        self.story = models.Story.objects.get(pk=self.story.pk)
+        self.use_debug_cursor = connection.use_debug_cursor
+
+    def test_save_in_place(self):
+        self.story.body = 'Fixed a typo.'
+        self.story.save_in_place()
+        self.assertEquals(models.Story.objects.filter(cid=self.story.cid).count(), 1)
+        self.assertEquals(models.Story.objects.get(pk=self.story.pk).body, 'Fixed a typo.')
+
+    def test_only_dirty_columns(self):
+        story = models.TrackedStory(title='A story', body='First revision.')
+        story.save()
+        connection.use_debug_cursor = True
+        try:
+            story.body = 'Fixed a typo.'
+            self.assertNumQueries(1, story.save_in_place)
+            sql = connection.queries[-1]['sql']
+        finally:
+            connection.use_debug_cursor = self.use_debug_cursor
+        self.assertTrue('"body"' in sql)
+        self.assertTrue('"vdatetime"' in sql)
+        self.assertFalse('"title"' in sql)
+        self.assertEquals(story.get_dirty_fields(), [])
+
+    def test_nothing_changed(self):
+        story = models.TrackedStory(title='A story', body='First revision.')
+        story.save()
+        self.assertNumQueries(0, story.save_in_place)
+
+    def test_untracked(self):
+        # without change tracking, there's no telling what changed
+        self.story.body = 'Fixed a typo.'
+        self.assertEquals(self.story.get_dirty_fields(), ['title', 'slug', 'body'])
+        self.assertNumQueries(1, self.story.save_in_place)
+
+    def test_inheritance(self):
+        story = models.FancyStory(title='A fancy story', body='First revision.')
+        story.save()
+        story = models.FancyStory.objects.get(pk=story.pk)
+        story.body = 'Fixed a typo.'
+        story.is_very_fancy = False
+        story.save_in_place()
+        story = models.FancyStory.objects.get(pk=story.pk)
+        self.assertEquals((story.body, story.is_very_fancy), ('Fixed a typo.', False))
+
+    def test_hashed(self):
+        story = models.HashedStory(title='A story', body='First revision.')
+        story.save()
+        story.body = 'Fixed a typo.'
+        story.save_in_place()
+        self.assertEquals(models.HashedStory.objects.get(pk=story.pk).vhash, story.compute_content_hash())
+
+    def test_save_hooks(self):
+        saved = []
+        def receiver(sender, instance, created, **kwargs):
+            saved.append((instance.slug, created))
+        post_save.connect(receiver, sender=models.Story, weak=False)
+        try:
+            self.story.title = 'A better title'
+            self.story.save_in_place()
+        finally:
+            post_save.disconnect(receiver, sender=models.Story)
+        # ``Story.save`` derives the slug from the title
+        self.assertEquals(saved, [('a-better-title', False)])
+        self.assertEquals(models.Story.objects.get(pk=self.story.pk).slug, 'a-better-title')
+
+    def test_tracked(self):
+        story = models.TrackedStory(title='A story', body='First revision.')
+        story.save()
+        story.body = 'Second revision.'
+        story = story.revise()
+        story.title = 'A better title'
+        story.save_in_place()
+        story = models.TrackedStory.objects.get(pk=story.pk)
+        self.assertEquals(story.get_changed_fields(), ['title', 'body'])
+        self.assertEquals([title for title, revision in story.title_history], ['A story', 'A better title'])
+
+    def test_admin(self):
+        from revisions.admin import VersionedAdminMixin
+        self.story.body = 'Fixed a typo.'
+        self.story.is_small_change = True
+        VersionedAdminMixin().save_model(None, self.story, None, True)
+        self.assertEquals(models.Story.objects.filter(cid=self.story.cid).count(), 1)
+        self.story.is_small_change = False
+        VersionedAdminMixin().save_model(None, self.story, None, True)
+        self.assertEquals(models.Story.objects.filter(cid=self.story.cid).count(), 2)
+
+class ConditionalHistoryTests(TestCase):
+    def setUp(self):
+        from django.contrib.admin.sites import AdminSite
+        from revisions.admin import RevisionsHistoryVersionedAdmin
+        self.admin = RevisionsHistoryVersionedAdmin(models.Story, AdminSite())
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.story = models.Story.objects.create(title="Hello", body="there")
+        self.story.revise()
+
+    def get(self, **headers):
+        request = RequestFactory().get('/', **headers)
+        request.user = self.user
+        return self.admin.revisions_history_view(request, str(self.story.pk))
+
+    def test_not_modified(self):
+        response = self.get()
+        self.assertTrue(response['ETag'])
+        self.assertTrue(response['Last-Modified'])
+        with self.assertNumQueries(2):
+            response = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(response.status_code, 304)
+
+    def test_last_modified(self):
+        # naive datetimes are in local time
+        modified = models.Story.objects.get(pk=self.story.pk).vdatetime
+        self.assertEquals(parse_http_date(self.get()['Last-Modified']), int(time.mktime(modified.timetuple())))
+
+    def test_unknown(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        self.assertRaises(Http404, self.admin.revisions_history_view, request, 'abc')
+        self.assertRaises(Http404, self.admin.revisions_diff_view, request, str(self.story.pk), 'abc')
+
+    def test_modified(self):
+        etag = self.get()['ETag']
+        self.story.body = "world"
+        self.story.revise()
+        self.assertEquals(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_changed_in_place(self):
+        etag = self.get()['ETag']
+        self.story.body = "world"
+        self.story.save_in_place()
+        self.assertEquals(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_no_modification_date(self):
+        from django.contrib.admin.sites import AdminSite
+        from revisions.admin import RevisionsHistoryVersionedAdmin
+        self.admin = RevisionsHistoryVersionedAdmin(models.ManualStory, AdminSite())
+        self.story = models.ManualStory.objects.create(title="Hello", body="there")
+        self.assertFalse(self.get().has_header('ETag'))
+
+class HistoryPaginationTests(TestCase):
+    def setUp(self):
+        from django.contrib.admin.sites import AdminSite
+        from revisions.admin import RevisionsHistoryVersionedAdmin
+        self.admin = RevisionsHistoryVersionedAdmin(models.Story, AdminSite())
+        self.admin.history_per_page = 2
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.story = models.Story.objects.create(title="Hello", body="there", vuser=self.user)
+        for i in range(4):
+            self.story.body = "Revision %i" % i
+            self.story.revise()
+
+    def test_pages(self):
+        seen = []
+        params = {}
+        while True:
+            request = RequestFactory().get('/', params)
+            request.user = self.user
+            response = self.admin.revisions_history_view(request, str(self.story.pk))
+            self.assertEquals(response.context_data['revision_count'], 5)
+            seen.extend(response.context_data['revision_list'])
+            if not response.context_data['next_page']:
+                break
+            params = QueryDict(response.context_data['next_page'])
+        self.assertEquals([story.pk for story in seen], 
+            [story.pk for story in reversed(self.story.get_revisions())])
+
+    def test_users_and_bodies(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        revisions, next_page = self.admin.get_history_page(request, self.story)
+        with self.assertNumQueries(0):
+            [revision.vuser for revision in revisions]
+        self.assertFalse('body' in revisions[0].__dict__)
+
+class RegistryTests(TestCase):
+    def test_registered_models(self):
+        registered = registry.get_models()
+        self.assertTrue(models.Story in registered)
+        self.assertTrue(models.UUIDStory in registered)
+        # proxies share their bundles with the concrete model
+        self.assertFalse(models.ConvenientStory in registered)
+        # regular models are not versioned
+        self.assertFalse(models.Info in registered)
+
+    def test_registered_metadata(self):
+        info = registry.get(models.FancyStory)
+        self.assertEquals(info.base_model, models.Story)
+        self.assertEquals(info.base_table, models.Story._meta.db_table)
+        self.assertEquals(info.comparator_name, 'vid')
+        self.assertFalse(info.trashable)
+        self.assertEquals(registry.get(models.UUIDStory).comparator_name, 'changed')
+
+    def test_trashable_models(self):
+        trashable = registry.get_models(trashable=True)
+        self.assertEquals(set(trashable), set([models.TrashableStory, models.FancyTrashableStory]))
+
+    def test_get_implementations(self):
+        implementations = VersionedModel.get_implementations()
+        self.assertTrue(models.Story in implementations)
+        self.assertFalse(models.ManualStory in implementations)
+        self.assertTrue(models.ManualStory in VersionedModelBase.get_implementations())
+
+class VersioningOptionsTests(TestCase):
+    def test_inheritance(self):
+        opts = models.FancyStory._versioning
+        self.assertEquals(opts.base_model, models.Story)
+        self.assertEquals(opts.pk_name, 'vid')
+        self.assertEquals(opts.comparator_name, 'vid')
+        self.assertEquals(opts.comparator_table, models.Story._meta.db_table)
+        self.assertEquals(opts.clear_each_revision, ('title', 'slug'))
+
+    def test_custom_comparator(self):
+        opts = models.UUIDStory._versioning
+        self.assertEquals(opts.pk_name, 'alt_id')
+        self.assertEquals(opts.comparator_name, 'changed')
+        self.assertTrue('changed' in opts.clone_skip_fields)
+        self.assertTrue('alt_id' in opts.clone_skip_fields)
+        self.assertFalse('title' in opts.clone_skip_fields)
+
+    def test_creation_dates(self):
+        self.assertTrue('created' in models.DatedStory._versioning.clone_skip_fields)
+        story = models.DatedStory.objects.create(title="Hello")
+        models.DatedStory.objects.filter(pk=story.pk).update(created=datetime(2010, 1, 1))
+        story = models.DatedStory.objects.get(pk=story.pk)
+        first_pk = story.pk
+        revision = story.revise()
+        self.assertEquals(models.DatedStory.objects.get(pk=first_pk).created, datetime(2010, 1, 1))
+        self.assertTrue(models.DatedStory.objects.get(pk=revision.pk).created > datetime(2010, 1, 1))
+
+    def test_defaults(self):
+        # UniqueStory has its own Versioning class without clear_each_revision
+        self.assertEquals(models.UniqueStory._versioning.clear_each_revision, ())
+
+    def test_unique_checks(self):
+        story = models.UniqueStory(title="hello", body="there")
+        for i in range(2):
+            unique_checks, date_checks = story._get_unique_checks()
+        checks = [check for model_class, check in unique_checks]
+        self.assertEquals(len(checks), len(set(checks)))
+        self.assertTrue(('body', ) in checks)
+        self.assertTrue(('title', 'slug') in checks)
+        self.assertTrue(('title', 'body') in checks)
+        self.assertFalse(('body', ) in [check for model_class, check in story._get_unique_checks(exclude=['body'])[0]])
+        # the model's own Meta is left alone
+        self.assertEquals(models.UniqueStory._meta.unique_together, (("title", "body"), ))
+
+    def test_read_only(self):
+        def change_comparator():
+            models.Story._versioning.comparator_name = 'title'
+        self.assertRaises(AttributeError, change_comparator)
+
+    def test_trash_index(self):
+        index = indexes.Index(models.TrashableStory._meta.db_table, ('cid', 'vid'), False, (('is_trash', True), ))
+        self.assertTrue(index in models.TrashableStory._versioning.indexes)
+        self.assertTrue(index.as_sql(connection).endswith('WHERE "is_trash" = 1;'))
+        self.assertNotEquals(index.get_name(connection), index._replace(condition=()).get_name(connection))
+
+    def test_bundle_indexes(self):
+        self.assertTrue(indexes.Index(models.Story._meta.db_table, ('cid', 'vid'), False) 
+            in models.Story._versioning.indexes)
+        # custom comparators get indexed too, optionally along with the primary key
+        table = models.UUIDStory._meta.db_table
+        self.assertTrue(indexes.Index(table, ('cid', 'changed'), False) in models.UUIDStory._versioning.indexes)
+        with self.settings(REVISIONS_COVERING_INDEXES=True):
+            opts = VersioningOptions(models.UUIDStory)
+        self.assertTrue(indexes.Index(table, ('cid', 'changed', 'alt_id'), False) in opts.indexes)
+
+    def test_history_defer(self):
+        self.assertEquals(models.Story._versioning.history_defer, ('body', ))
+        self.assertEquals(models.PublishedStory._versioning.history_defer, ('body', ))
+        self.assertFalse('vid' in models.PublishedStory._versioning.history_defer)
+
+class ConcurrencyTests(TestCase):
+    def setUp(self):
+        self.story = models.SequencedStory.objects.create(title="Hello", body="there")
+
+    def test_sequence(self):
+        self.assertEquals(self.story.vseq, 1)
+        self.story.body = "world"
+        self.story.revise()
+        self.story.revise()
+        self.assertEquals([revision.vseq for revision in self.story.get_revisions()], [1, 2, 3])
+
+    def test_conflict(self):
+        mine = models.SequencedStory.latest.get(cid=self.story.cid)
+        theirs = models.SequencedStory.latest.get(cid=self.story.cid)
+        mine.body = "mine"
+        mine.revise()
+        theirs.body = "theirs"
+        self.assertRaises(RevisionConflict, theirs.revise)
+        self.assertEquals(len(self.story.get_revisions()), 2)
+        self.assertEquals(models.SequencedStory.latest.get(cid=self.story.cid).body, "mine")
+
+    def test_revert_conflict(self):
+        stale = models.SequencedStory.latest.get(cid=self.story.cid)
+        self.story.body = "world"
+        self.story.revise()
+        self.assertRaises(RevisionConflict, stale.revert_to, stale.pk)
+        self.story.revert_to(stale.pk)
+        self.assertEquals(self.story.get_latest_revision().body, "there")
+
+    def test_retry(self):
+        calls = []
+        @retry_on_conflict(attempts=3)
+        def edit(body):
+            story = models.SequencedStory.latest.get(cid=self.story.cid)
+            story.body = body
+            if not calls:
+                # somebody beats us to it
+                self.story.revise()
+            calls.append(body)
+            story.revise()
+        edit("world")
+        self.assertEquals(len(calls), 2)
+        self.assertEquals(models.SequencedStory.latest.get(cid=self.story.cid).body, "world")
+
+class RoutingTests(TestCase):
+    def test_defaults(self):
+        self.assertEquals(routers.db_for_latest(models.Story), 'default')
+        self.assertEquals(routers.db_for_history(models.Story), 'default')
+        self.assertEquals(models.Story.latest.current.db, 'default')
+
+    def test_settings(self):
+        with self.settings(REVISIONS_LATEST_DB='replica', REVISIONS_HISTORY_DB='archive'):
+            self.assertEquals(models.Story.latest.current.db, 'replica')
+            self.assertEquals(models.PublishedStory.latest.as_of(date(2010, 1, 1)).db, 'archive')
+            self.assertEquals(models.TemporalStory.latest.during(date(2010, 1, 1), date(2010, 2, 1)).db, 'archive')
+            # explicitly chosen databases take precedence
+            self.assertEquals(models.Story.latest.db_manager('other').current.db, 'other')
+
+    def test_routers(self):
+        class HistoryRouter(object):
+            def db_for_history(self, model, **hints):
+                return 'archive'
+        router.routers.insert(0, HistoryRouter())
+        try:
+            self.assertEquals(routers.db_for_history(models.Story), 'archive')
+            self.assertEquals(routers.db_for_latest(models.Story), 'default')
+        finally:
+            del router.routers[0]
+
+    def test_writes(self):
+        story = models.Story.objects.create(title="Hello", body="there")
+        self.assertEquals(routers.db_for_write(models.Story, story), 'default')
+        with self.settings(REVISIONS_HISTORY_DB='archive'):
+            story._state.db = 'archive'
+            self.assertEquals(routers.db_for_write(models.Story, story), 'default')
+            # writes end up on the primary database
+            story.body = "world"
+            story.revise()
+            self.assertEquals(story._state.db, 'default')
+        self.assertEquals(len(story.get_revisions()), 2)
+
+    def test_bundle_reads(self):
+        trashable = models.TrashableStory.objects.create(title="Hello", body="there")
+        story = models.Story.objects.create(title="Hello", body="there")
+        with self.settings(REVISIONS_LATEST_DB='replica', REVISIONS_HISTORY_DB='archive'):
+            self.assertEquals(trashable.get_content_bundle().db, 'default')
+            self.assertEquals(story._get_related_objects(story.aside_set).db, 'default')
+
+class BundleIdTests(TestCase):
+    def test_hex(self):
+        story = models.Story.objects.create(title="Hello", body="there")
+        self.assertEquals(models.Story._versioning.bundle_id, 'hex')
+        self.assertEquals(len(story.cid), 32)
+
+    def test_integer(self):
+        story = models.CompactStory.objects.create(title="Hello", body="there")
+        self.assertEquals(story.cid, story.pk)
+        story = models.CompactStory.objects.get(pk=story.pk)
+        self.assertEquals(story.cid, story.pk)
+        first = story.pk
+        story.body = "world"
+        story.revise()
+        self.assertEquals(story.cid, first)
+        self.assertEquals(len(story.get_revisions()), 2)
+        self.assertEquals(models.CompactStory.latest.get(cid=first).body, "world")
+
+    def test_uuid(self):
+        field = copy(models.Story._meta.get_field('cid'))
+        field.id_type = 'uuid'
+        value = '6f3c6e24-2fd1-4e3a-9b67-5c1d0a1f9b9e'
+        self.assertEquals(field.to_python(value), value.replace('-', ''))
+        self.assertEquals(field.get_prep_value(value.replace('-', '')), value.replace('-', ''))
+
+    def test_convert(self):
+        story = models.CompactStory.objects.create(title="Hello", body="there")
+        first = story.pk
+        story.body = "world"
+        story.revise()
+        other = models.CompactStory.objects.create(title="Goodbye", body="there")
+        # bundle ids the way they were before the switch to integers
+        cursor = connection.cursor()
+        for bundle in (first, other.pk):
+            cursor.execute('UPDATE %s SET cid = %%s WHERE cid = %%s' % models.CompactStory._meta.db_table,
+                [uuid.uuid4().hex, bundle])
+        call_command('convertbundleids', 'tests.CompactStory', chunk_size=1, verbosity=0)
+        self.assertEquals([revision.cid for revision in story.get_revisions()], [first, first])
+        self.assertEquals(models.CompactStory.latest.get(cid=other.pk).title, "Goodbye")
+
+class ExportImportTests(TestCase):
+    def setUp(self):
+        story = models.TrashableStory.objects.create(title="Hello", body="there")
+        story.body = "world"
+        story.revise()
+        models.TrashableStory.objects.create(title="Goodbye", body="there").delete()
+        handle, self.filename = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def get_rows(self):
+        return list(models.TrashableStory.objects.order_by('pk').values())
+
+    def test_export(self):
+        call_command('exportbundles', 'tests.TrashableStory', chunk_size=1, output=self.filename, verbosity=0)
+        bundles = [json.loads(line) for line in open(self.filename)]
+        self.assertEquals(len(bundles), 2)
+        self.assertEquals(sorted([len(bundle['revisions']) for bundle in bundles]), [1, 2])
+        self.assertEquals([bundle['cid'] for bundle in bundles], sorted([bundle['cid'] for bundle in bundles]))
+
+    def test_roundtrip(self):
+        rows = self.get_rows()
+        call_command('exportbundles', 'tests.TrashableStory', output=self.filename, verbosity=0)
+        models.TrashableStory.objects.all().delete()
+        call_command('importbundles', self.filename, chunk_size=1, verbosity=0)
+        self.assertEquals(self.get_rows(), rows)
+        # bundles that are already there get skipped
+        call_command('importbundles', self.filename, verbosity=0)
+        self.assertEquals(self.get_rows(), rows)
+        self.assertEquals(len(models.TrashableStory.latest.trash), 1)
+
 #
 # Browser tests
 #
@@ -1,5 +1,11 @@
 # encoding: utf-8
 
+from functools import wraps
+from django.db import transaction
+from revisions.instrumentation import instrumented
+from revisions.routers import db_for_write
+from revisions.signals import send, revision_created
+
 try:
     from django_extensions.db.fields import CreationDateTimeField
 except:
@@ -7,22 +13,19 @@ except:
 
 # Since Django 1.2, a simple copy.copy(model) w/ pk = None stopped working.
 class ClonableMixin(object):
+    @instrumented('clone')
     def clone(self):    
         duplicate = self.__class__()
+        # primary keys, the comparator and creation dates don't get copied, 
+        # so that every revision gets its own (see ``VersioningOptions.clone_skip_fields``)
+        skip = self._versioning.clone_skip_fields
         for field in self._meta.fields:
-            pk = field.primary_key
-            comparator = (field.name is self.comparator_name)
-            # people expect these fields to work per-bundle, not per-revision, 
-            # so we'll overwrite these values with the old ones
-            auto_field = \
-                isinstance(field, CreationDateTimeField) or \
-                getattr(field, 'auto_now_add', False)
-
-            if not (pk or auto_field or comparator):
+            if field.name not in skip:
                 value = getattr(self, field.name)
                 setattr(duplicate, field.name, value)
         
-        duplicate.save()
+        duplicate._cloning = True
+        duplicate.save(using=db_for_write(self.__class__, self))
         
         # ... but the trick loses all ManyToMany relations.
         for field in self._meta.many_to_many:
@@ -31,5 +34,60 @@ class ClonableMixin(object):
             for item in source.all():
                 destination.add(item)
         
+        send(revision_created, self.__class__, instance=duplicate, cid=duplicate.cid, 
+            old_pk=self.pk, new_pk=duplicate.pk, using=duplicate._state.db)
         self.pk = duplicate.pk
-        return duplicate
\ No newline at end of file
+        self._state.db = duplicate._state.db
+        if self._versioning.sequenced:
+            self.vseq = duplicate.vseq
+        if self._versioning.tracked:
+            self._loaded_values = duplicate._loaded_values
+        return duplicate
+
+def retry_on_conflict(attempts=3):
+    """ Calls the decorated function again when it raises a ``RevisionConflict``
+    (see ``revisions.models.SequencedModel``), up to ``attempts`` times in all. 
+    The function should fetch the latest revision anew on every call::
+    
+        @retry_on_conflict(attempts=5)
+        def retitle(cid, title):
+            story = Story.latest.get(cid=cid)
+            story.title = title
+            story.revise()
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*vargs, **kwargs):
+            from revisions.models import RevisionConflict
+            for attempt in range(attempts - 1):
+                try:
+                    return func(*vargs, **kwargs)
+                except RevisionConflict:
+                    pass
+            return func(*vargs, **kwargs)
+        return wrapper
+    return decorator
+
+class atomic(object):
+    """ Like ``transaction.commit_on_success``, except that inside of a 
+    transaction that's already under way, it uses a savepoint instead, 
+    rather than committing that transaction halfway through. """
+
+    def __init__(self, using):
+        self.using = using
+
+    def __enter__(self):
+        if transaction.is_managed(using=self.using):
+            self.transaction = None
+            self.sid = transaction.savepoint(using=self.using)
+        else:
+            self.transaction = transaction.commit_on_success(using=self.using)
+            self.transaction.__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.transaction is not None:
+            return self.transaction.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None:
+            transaction.savepoint_commit(self.sid, using=self.using)
+        else:
+            transaction.savepoint_rollback(self.sid, using=self.using)
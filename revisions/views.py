@@ -1,13 +1,230 @@
-from django.views.generic import direct_to_template
-from revisions.models import VersionedModel
+import json
+import heapq
+import hashlib
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db.models import Q, get_model
+from django.http import HttpResponse, HttpResponseRedirect, HttpResponseNotAllowed, Http404
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.datastructures import SortedDict
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import ugettext as _
+from django.views.decorators.http import condition
+from revisions.diffs import diff_revisions
+from revisions.registry import registry
+from revisions.routers import db_for_history
 
-def differ(request, compare_baseline_pk, compare_with_pk):
-    raise NotImplementedError
+TRASHCAN_PAGE_SIZE = 50
+# diffs can change when revisions get changed in place, so clients revalidate
+DIFF_CACHE_CONTROL = {'max-age': 0, 'must-revalidate': True}
+DIFF_IGNORED_FIELDS = ('vid', 'vuser', 'vdatetime', 'cid')
 
-def trashcan(request, model=None):
+def get_versioned_model(model):
+    if isinstance(model, basestring):
+        model = get_model(*model.split('.', 1))
+    if model is None or model not in registry:
+        raise Http404("Unknown model.")
+    return model
+
+def get_revision(model, pk):
+    try:
+        pk = model._meta.pk.to_python(pk)
+    except ValidationError:
+        raise Http404('No %s matches the given query.' % model._meta.object_name)
+    return get_object_or_404(model.objects.using(db_for_history(model)), pk=pk)
+
+def get_diff_format(request):
+    if request.GET.get('format') in ('json', 'html'):
+        return request.GET['format']
+    elif 'application/json' in request.META.get('HTTP_ACCEPT', ''):
+        return 'json'
+    else:
+        return 'html'
+
+def get_revision_markers(model, pks):
+    """ Something that changes whenever any of these revisions changes, 
+    including changes saved in place: their content hash and last modification 
+    dates, or, for models that have neither, a hash of their content. """
+    names = [field.attname for field in model._meta.fields if getattr(field, 'auto_now', False)]
+    if model._versioning.hashed:
+        names.append('vhash')
+    objects = model.objects.using(db_for_history(model)).filter(pk__in=pks)
+    if names:
+        markers = dict([(row[0], row[1:]) for row in objects.values_list('pk', *names)])
+    else:
+        markers = dict([(obj.pk, obj.compute_content_hash()) for obj in objects])
+    if len(markers) < len(set(pks)):
+        raise Http404('No %s matches the given query.' % model._meta.object_name)
+    return [markers[pk] for pk in pks]
+
+def get_diff_etag(request, compare_baseline_pk, compare_with_pk, model=None, **kwargs):
+    model = get_versioned_model(model)
+    try:
+        pks = [model._meta.pk.to_python(pk) for pk in (compare_baseline_pk, compare_with_pk)]
+    except ValidationError:
+        raise Http404('No %s matches the given query.' % model._meta.object_name)
+    key = '%s:%s:%s:%r' % (model._meta.db_table, ':'.join(map(unicode, pks)), 
+        get_diff_format(request), get_revision_markers(model, pks))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+@staff_member_required
+def differ(request, compare_baseline_pk, compare_with_pk, model=None, 
+        template_name='revisions/diff.html'):
+    """
+    The differences between two revisions of the same bundle, field by field, 
+    as HTML or, with ``?format=json`` or an ``Accept: application/json`` 
+    header, as JSON. Pass in the versioned model (or its ``app_label.Model`` 
+    name) as ``model`` from your URLconf. Only staff members who can change
+    the model get to see diffs.
+    
+    Responses carry an ETag derived from the two revisions, including 
+    changes saved in place, and are private to the user. By default, 
+    clients revalidate them on every request, which ``REVISIONS_DIFF_CACHE_CONTROL``
+    can change.
+    """
+    model = get_versioned_model(model)
+    opts = model._meta
+    if not request.user.has_perm(opts.app_label + '.' + opts.get_change_permission()):
+        raise PermissionDenied
+    return render_diff(request, compare_baseline_pk, compare_with_pk, model=model, template_name=template_name)
+
+@condition(etag_func=get_diff_etag)
+def render_diff(request, compare_baseline_pk, compare_with_pk, model, template_name):
+    baseline = get_revision(model, compare_baseline_pk)
+    compare_with = get_revision(model, compare_with_pk)
+    if baseline.cid != compare_with.cid:
+        raise Http404("These revisions belong to different bundles.")
+
+    diff_list = diff_revisions(baseline, compare_with, exclude=DIFF_IGNORED_FIELDS)
+    if get_diff_format(request) == 'json':
+        response = HttpResponse(json.dumps({
+            'model': '%s.%s' % (model._meta.app_label, model._meta.object_name),
+            'cid': baseline.cid,
+            'from': baseline.pk,
+            'to': compare_with.pk,
+            'fields': diff_list,
+            }), content_type='application/json')
+    else:
+        response = TemplateResponse(request, template_name, {
+            'title': u'%s \u2192 %s' % (baseline, compare_with),
+            'diff_list': diff_list,
+            'baseline': baseline,
+            'compare_with': compare_with,
+            })
+
+    patch_cache_control(response, private=True, 
+        **getattr(settings, 'REVISIONS_DIFF_CACHE_CONTROL', DIFF_CACHE_CONTROL))
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+def get_label(model):
+    return '%s.%s' % (model._meta.app_label, model._meta.module_name)
+
+def get_trash(model, cursor=None):
+    """ The latest revision of every trashed bundle of ``model``, most recently 
+    trashed first, that comes after ``cursor`` -- a ``(trashed_at, label, cid)``
+    tuple -- in that order. """
+    qs = model.latest.trash.filter(trashed_at__isnull=False)
+    if cursor:
+        trashed_at, label, cid = cursor
+        own_label = get_label(model)
+        if own_label < label:
+            qs = qs.filter(trashed_at__lte=trashed_at)
+        elif own_label == label:
+            qs = qs.filter(Q(trashed_at__lt=trashed_at) | Q(trashed_at=trashed_at, cid__lt=cid))
+        else:
+            qs = qs.filter(trashed_at__lt=trashed_at)
+    return qs.order_by('-trashed_at', '-cid')
+
+def parse_cursor(value):
+    try:
+        trashed_at, label, cid = value.split(',', 2)
+    except ValueError:
+        raise Http404("Invalid page.")
+    trashed_at = parse_datetime(trashed_at)
+    if not trashed_at:
+        raise Http404("Invalid page.")
+    return trashed_at, label, cid
+
+def format_cursor(obj):
+    return '%s,%s,%s' % (obj.trashed_at.isoformat(), get_label(obj.__class__), obj.cid)
+
+@staff_member_required
+def trashcan(request, model=None, page_size=TRASHCAN_PAGE_SIZE, template_name='revisions/trashcan.html'):
+    """
+    Lists trashed content across all trashable versioned models (or just the 
+    one you pass in), most recently trashed first, and restores or permanently
+    deletes whatever gets posted back.
+    
+    Paging happens on trash time rather than on offsets, so every page takes 
+    one query per model, no matter how deep into the trash you are: we ask 
+    every model for a page worth of trash from where the last page left off,
+    and merge the results.
+    """
     if not model:
-        models = VersionedModel.get_implementations()
+        models = registry.get_models(trashable=True)
     else:
         models = [model]
+    # with concrete inheritance, the trash of the parent model includes
+    # the trash of its children
+    models = SortedDict([(get_label(model), model) for model in models 
+        if model._versioning.base_model is model or model._versioning.base_model not in models])
     
-    raise NotImplementedError
\ No newline at end of file
+    if request.method == 'POST':
+        return trashcan_action(request, models)
+    elif request.method != 'GET':
+        return HttpResponseNotAllowed(['GET', 'POST'])
+
+    cursor = request.GET.get('after') and parse_cursor(request.GET['after']) or None
+    candidates = []
+    for label, model in models.items():
+        candidates.extend(get_trash(model, cursor)[:page_size + 1])
+    key = lambda obj: (obj.trashed_at, get_label(obj.__class__), obj.cid)
+    objects = heapq.nlargest(page_size + 1, candidates, key=key)
+
+    trash_list = [{
+        'object': obj,
+        'bundle': '%s:%s' % (get_label(obj.__class__), obj.cid),
+        'verbose_name': obj._meta.verbose_name,
+        } for obj in objects[:page_size]]
+
+    context = {
+        'title': _('Trash'),
+        'trash_list': trash_list,
+        'next_page': len(objects) > page_size and format_cursor(objects[page_size - 1]) or None,
+    }
+    return TemplateResponse(request, template_name, context)
+
+def trashcan_action(request, models):
+    action = request.POST.get('action')
+    if action not in ('restore', 'delete'):
+        raise Http404("Unknown action.")
+
+    # bundles come in as app_label.model_name:cid
+    bundles = SortedDict()
+    for value in request.POST.getlist('bundles'):
+        label, sep, cid = value.partition(':')
+        if label not in models:
+            raise Http404("Unknown model.")
+        bundles.setdefault(label, []).append(cid)
+
+    # restoring content changes it, deleting it for good deletes it
+    for label, cids in bundles.items():
+        opts = models[label]._meta
+        if action == 'restore':
+            permission = opts.get_change_permission()
+        else:
+            permission = opts.get_delete_permission()
+        if not request.user.has_perm('%s.%s' % (opts.app_label, permission)):
+            raise PermissionDenied
+
+    for label, cids in bundles.items():
+        if action == 'restore':
+            models[label].restore_bundles(cids)
+        else:
+            models[label].delete_bundles_permanently(cids)
+
+    return HttpResponseRedirect(request.get_full_path())